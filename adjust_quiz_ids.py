@@ -1,57 +1,162 @@
-import json
+import argparse
 import os
 import re
 import glob
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack, nullcontext
+from functools import partial
 
+from io_utils import (
+    COMPRESSION_SUFFIXES, AtomicWriteBatch, abort_atomic, atomic_write, compressed_path, compression_for_path,
+    dump_json, file_signature, finish_atomic, json_dumps, load_json, open_atomic, open_input,
+)
 
-def merge_quiz_jsons(directory_path, output_file=None):
+# File merged_*_quizzes.json chỉ do máy đọc nên mặc định được ghi gọn, không thụt lề
+MERGED_OUTPUT_PROFILE = "compact"
+
+
+def merged_file_path(base_directory, folder_name, compression=None):
+    """Đường dẫn file merged_<thư mục>_quizzes.json, thêm .gz/.zst nếu nén"""
+    return compressed_path(os.path.join(base_directory, f"merged_{folder_name}_quizzes.json"), compression)
+
+
+def find_merged_file(base_directory, folder_name):
+    """File merged mới nhất của một thư mục (không nén, .gz hoặc .zst), None nếu chưa có"""
+    file_paths = [
+        file_path
+        for file_path in (
+            merged_file_path(base_directory, folder_name, compression) for compression in (None, *COMPRESSION_SUFFIXES)
+        )
+        if os.path.exists(file_path)
+    ]
+    return max(file_paths, key=os.path.getmtime, default=None)
+
+
+class MergedQuizWriter:
+    """
+    Ghi file merged_*_quizzes.json theo kiểu streaming: phần mở đầu {"quizzes": [
+    được ghi một lần, sau đó từng quiz được nối thẳng vào file ngay khi đọc xong.
+
+    Kết quả giống hệt từng byte với json_dumps({"quizzes": [...]}, profile), được nén dần khi ghi
+    nếu output_file có đuôi .gz/.zst.
+    Dữ liệu được ghi vào file tạm và chỉ thay thế file đích khi close(), nên file merged cũ
+    vẫn còn nguyên nếu quá trình gộp bị lỗi hoặc bị dừng giữa chừng
+    """
+
+    # Mỗi quiz nằm ở cấp lồng thứ hai trong {"quizzes": [ ... ]}
+    ITEM_INDENT = " " * 8
+
+    def __init__(self, output_file, batch=None, profile="pretty"):
+        self.output_file = output_file
+        self.quiz_count = 0
+        self._batch = batch
+        self._pretty = profile == "pretty"
+        self.profile = profile
+        self._file, self._temp_path = open_atomic(output_file)
+        self._file.write('{\n    "quizzes": [' if self._pretty else '{"quizzes":[')
+
+    def write_quiz(self, quiz):
+        """Nối một quiz vào mảng quizzes của file đầu ra"""
+        self.write_quiz_json(json_dumps(quiz, self.profile))
+
+    def write_quiz_json(self, text):
+        """Nối một quiz đã được chuyển thành JSON bằng json_dumps(quiz, self.profile)"""
+        if self._pretty:
+            # JSON luôn escape ký tự xuống dòng trong chuỗi, nên mọi "\n" ở đây
+            # đều là xuống dòng do indent tạo ra và có thể thụt lề thêm một cách an toàn
+            self._file.write("\n" if self.quiz_count == 0 else ",\n")
+            self._file.write(self.ITEM_INDENT)
+            self._file.write(text.replace("\n", "\n" + self.ITEM_INDENT))
+        else:
+            if self.quiz_count:
+                self._file.write(",")
+            self._file.write(text)
+        self.quiz_count += 1
+
+    def close(self):
+        """Đóng mảng quizzes và thay thế file đầu ra"""
+        if self._file.closed:
+            return
+        if self._pretty:
+            self._file.write("\n    ]\n}" if self.quiz_count else "]\n}")
+        else:
+            self._file.write("]}")
+        finish_atomic(self._file, self._temp_path, self.output_file, self._batch)
+
+    def abort(self):
+        """Hủy file đang ghi, giữ nguyên file đầu ra cũ"""
+        if not self._file.closed:
+            abort_atomic(self._file, self._temp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def merge_quiz_jsons(directory_path, output_file=None, streaming=True, batch=None, profile="pretty"):
     """
     Gộp các file JSON của bài kiểm tra trong một thư mục vào một file duy nhất
 
     Args:
         directory_path (str): Đường dẫn đến thư mục chứa các file JSON đã xử lý
-        output_file (str, optional): Tên file đầu ra. Mặc định là merged_quizzes.json trong thư mục gốc
+        output_file (str, optional): Tên file đầu ra, được nén nếu có đuôi .gz/.zst. Mặc định là
+            merged_quizzes.json trong thư mục gốc
+        streaming (bool): Ghi từng quiz ra file ngay khi đọc, không giữ toàn bộ danh mục trong bộ nhớ.
+            Đặt False để dùng cách cũ (gộp hết vào một dict rồi ghi một lần)
+        batch (AtomicWriteBatch, optional): Dồn việc fsync và thay thế file đầu ra vào batch
+        profile (str): Kiểu định dạng đầu ra, "pretty" (thụt lề 4) hoặc "compact"
 
     Returns:
         str: Đường dẫn đến file đã gộp
     """
     try:
-        # Khởi tạo cấu trúc JSON kết quả với mảng quizzes rỗng
-        merged_data = {"quizzes": []}
-
         # Lấy tất cả file JSON trong thư mục
         json_files = [f for f in os.listdir(directory_path) if f.endswith(".json")]
         json_files.sort()
 
         print(f"\nĐang gộp {len(json_files)} file JSON...")
 
-        # Đọc từng file và gộp vào merged_data
-        for file_name in json_files:
-            file_path = os.path.join(directory_path, file_name)
-
-            with open(file_path, "r", encoding="utf-8") as f:
-                quiz_data = json.load(f)
-
-                if "quizzes" in quiz_data:
-                    # Thêm từng quiz vào mảng quizzes của kết quả
-                    for quiz in quiz_data["quizzes"]:
-                        merged_data["quizzes"].append(quiz)
-                    print(f"Đã gộp dữ liệu từ {file_name}")
-                else:
-                    print(f"Bỏ qua {file_name}: không tìm thấy mảng 'quizzes'")
-
         # Xác định đường dẫn file đầu ra
         if not output_file:
             output_file = os.path.join(
                 os.path.dirname(directory_path), "merged_quizzes.json"
             )
 
-        # Ghi file kết quả
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(merged_data, f, ensure_ascii=False, indent=4)
+        if streaming:
+            with MergedQuizWriter(output_file, batch, profile) as writer:
+                for file_name in json_files:
+                    quizzes = _load_quizzes_for_merge(directory_path, file_name)
+                    if quizzes is None:
+                        continue
+                    for quiz in quizzes:
+                        writer.write_quiz(quiz)
+                    # Giải phóng dữ liệu của file này trước khi đọc file tiếp theo
+                    del quizzes
+            quiz_count = writer.quiz_count
+        else:
+            # Khởi tạo cấu trúc JSON kết quả với mảng quizzes rỗng
+            merged_data = {"quizzes": []}
+
+            # Đọc từng file và gộp vào merged_data
+            for file_name in json_files:
+                quizzes = _load_quizzes_for_merge(directory_path, file_name)
+                if quizzes is not None:
+                    merged_data["quizzes"].extend(quizzes)
+
+            # Ghi file kết quả
+            with atomic_write(output_file, batch=batch) as f:
+                dump_json(merged_data, f, profile)
+            quiz_count = len(merged_data["quizzes"])
 
         print(
-            f"\nĐã gộp thành công {len(merged_data['quizzes'])} bài kiểm tra vào file: {output_file}"
+            f"\nĐã gộp thành công {quiz_count} bài kiểm tra vào file: {output_file}"
         )
         return output_file
 
@@ -60,7 +165,115 @@ def merge_quiz_jsons(directory_path, output_file=None):
         return None
 
 
-def adjust_quiz_ids(file_path, new_start_question_id, new_start_option_id):
+def _load_quizzes_for_merge(directory_path, file_name):
+    """Đọc mảng quizzes của một file để gộp, trả về None nếu file không có mảng này"""
+    file_path = os.path.join(directory_path, file_name)
+
+    try:
+        quiz_data = load_json(file_path)
+    except Exception as e:
+        print(f"Bỏ qua {file_name}: không đọc được file ({e})")
+        return None
+
+    if isinstance(quiz_data, dict) and "quizzes" in quiz_data:
+        print(f"Đã gộp dữ liệu từ {file_name}")
+        return quiz_data["quizzes"]
+
+    print(f"Bỏ qua {file_name}: không tìm thấy mảng 'quizzes'")
+    return None
+
+
+def renumber_quiz_data(quiz_data, new_start_question_id, new_start_option_id):
+    """
+    Đánh lại ID câu hỏi và lựa chọn trên dữ liệu quiz đã đọc vào bộ nhớ (sửa trực tiếp quiz_data)
+
+    Args:
+        quiz_data (dict): Dữ liệu JSON của file bài kiểm tra
+        new_start_question_id (int): ID bắt đầu mới cho câu hỏi
+        new_start_option_id (int): ID bắt đầu mới cho lựa chọn
+
+    Returns:
+        tuple: (max_question_id, max_option_id, changed) sau khi điều chỉnh, với changed cho biết
+            dữ liệu có thực sự thay đổi hay không (ID mới trùng hoàn toàn với ID cũ)
+    """
+    max_question_id = new_start_question_id
+    max_option_id = new_start_option_id
+    changed = False
+
+    # Xử lý từng bài kiểm tra
+    for quiz in quiz_data["quizzes"]:
+        if "questions" in quiz:
+            current_question_id = new_start_question_id
+            current_option_id = new_start_option_id
+            image_url_pattern = None
+
+            for question in quiz["questions"]:
+                # Lưu ID gốc để cập nhật các mối quan hệ
+                original_question_id = question["id"]
+
+                # Cập nhật ID câu hỏi
+                if original_question_id != current_question_id:
+                    question["id"] = current_question_id
+                    changed = True
+                max_question_id = max(max_question_id, current_question_id)
+
+                # Cập nhật mẫu URL hình ảnh để sử dụng ID câu hỏi thay vì số thứ tự
+                if "image_url" in question and question["image_url"]:
+                    # Mẫu quiz_x_question_y chỉ phụ thuộc vào quiz nên được biên dịch một lần cho mỗi quiz
+                    if image_url_pattern is None:
+                        quiz_id = quiz["id"]
+                        image_url_pattern = re.compile(f"quiz_{quiz_id}_question_\\d+")
+                        image_url_prefix = f"quiz_{quiz_id}_question_"
+
+                    # Thay thế quiz_x_question_y bằng quiz_x_question_id
+                    image_url = image_url_pattern.sub(
+                        image_url_prefix + str(current_question_id), question["image_url"]
+                    )
+                    if image_url != question["image_url"]:
+                        question["image_url"] = image_url
+                        changed = True
+
+                # Cập nhật các lựa chọn
+                if "options" in question:
+                    for option in question["options"]:
+                        # Cập nhật ID lựa chọn và tham chiếu question_id trong các lựa chọn
+                        if (option.get("id") != current_option_id
+                                or option.get("question_id") != current_question_id):
+                            option["id"] = current_option_id
+                            option["question_id"] = current_question_id
+                            changed = True
+                        max_option_id = max(max_option_id, current_option_id)
+
+                        current_option_id += 1
+
+                current_question_id += 1
+
+    return max_question_id, max_option_id, changed
+
+
+def _copy_backup(source_path, backup_path):
+    """
+    Sao chép nguyên byte file gốc làm bản backup, không mã hóa lại JSON
+
+    Trên Linux dùng copy_file_range để kernel tự sao chép (hoặc reflink trên btrfs/XFS),
+    nếu không được thì quay về shutil.copyfile (sendfile/fcopyfile tùy hệ điều hành)
+    """
+    if hasattr(os, "copy_file_range"):
+        try:
+            with open(source_path, "rb") as src, open(backup_path, "wb") as dst:
+                remaining = os.fstat(src.fileno()).st_size
+                while remaining > 0:
+                    copied = os.copy_file_range(src.fileno(), dst.fileno(), remaining)
+                    if copied == 0:
+                        break
+                    remaining -= copied
+            return
+        except OSError:
+            pass
+    shutil.copyfile(source_path, backup_path)
+
+
+def adjust_quiz_ids(file_path, new_start_question_id, new_start_option_id, quiz_data=None, batch=None, profile="pretty"):
     """
     Điều chỉnh ID của câu hỏi và lựa chọn trong file JSON của bài kiểm tra để bắt đầu từ số được chỉ định
     và cập nhật URL hình ảnh để sử dụng ID câu hỏi thay vì số thứ tự
@@ -69,81 +282,367 @@ def adjust_quiz_ids(file_path, new_start_question_id, new_start_option_id):
         file_path (str): Đường dẫn đến file JSON bài kiểm tra
         new_start_question_id (int): ID bắt đầu mới cho câu hỏi
         new_start_option_id (int): ID bắt đầu mới cho lựa chọn
+        quiz_data (dict, optional): Dữ liệu của file đã được đọc sẵn, để không phải đọc lại file
+        batch (AtomicWriteBatch, optional): Dồn việc fsync và thay thế file vào batch thay vì làm ngay
+        profile (str): Kiểu định dạng khi ghi lại file, "pretty" (thụt lề 4) hoặc "compact"
 
     Returns:
         tuple: (max_question_id, max_option_id) sau khi điều chỉnh
     """
+    max_question_id, max_option_id, _ = _adjust_quiz_ids(
+        file_path, new_start_question_id, new_start_option_id, quiz_data, batch, profile
+    )
+    return max_question_id, max_option_id
+
+
+def _adjust_quiz_ids(file_path, new_start_question_id, new_start_option_id, quiz_data=None, batch=None, profile="pretty"):
+    """
+    Như adjust_quiz_ids nhưng cho biết thêm file có được ghi lại hay không
+
+    Returns:
+        tuple: (max_question_id, max_option_id, written)
+    """
     try:
         # Đọc file JSON gốc
-        with open(file_path, "r", encoding="utf-8") as f:
-            quiz_data = json.load(f)
+        if quiz_data is None:
+            quiz_data = load_json(file_path)
+
+        max_question_id, max_option_id, changed = renumber_quiz_data(
+            quiz_data, new_start_question_id, new_start_option_id
+        )
+
+        # ID mới trùng với ID hiện có: không cần backup hay ghi lại file
+        if not changed:
+            print(f"Bỏ qua {file_path}: ID đã đúng, không có gì thay đổi")
+            return max_question_id, max_option_id, False
 
         # Tạo thư mục backup nếu chưa tồn tại
         backup_dir = os.path.join(os.path.dirname(file_path), "backup")
         os.makedirs(backup_dir, exist_ok=True)
 
-        # Tạo bản sao lưu của file gốc trong thư mục backup
+        # Tạo bản sao lưu của file gốc trong thư mục backup (file trên đĩa vẫn là bản gốc)
         backup_filename = os.path.basename(file_path) + ".backup"
         backup_path = os.path.join(backup_dir, backup_filename)
-        with open(backup_path, "w", encoding="utf-8") as f:
-            json.dump(quiz_data, f, ensure_ascii=False, indent=4)
+        _copy_backup(file_path, backup_path)
         print(f"Backup đã lưu vào {backup_path}")
 
-        max_question_id = new_start_question_id
-        max_option_id = new_start_option_id
+        # Lưu file JSON đã cập nhật (ghi file tạm rồi thay thế, không bao giờ để file dở dang)
+        with atomic_write(file_path, batch=batch) as f:
+            dump_json(quiz_data, f, profile)
+
+        print(f"Đã cập nhật {file_path} với ID mới:")
+        print(f"- Câu hỏi bắt đầu từ: {new_start_question_id}")
+        print(f"- Lựa chọn bắt đầu từ: {new_start_option_id}")
+        print(f"- URL hình ảnh đã cập nhật để sử dụng ID câu hỏi")
+
+        return max_question_id, max_option_id, True
 
-        # Xử lý từng bài kiểm tra
-        for quiz in quiz_data["quizzes"]:
-            if "questions" in quiz:
-                current_question_id = new_start_question_id
-                current_option_id = new_start_option_id
+    except Exception as e:
+        print(f"Lỗi: {e}")
+        return new_start_question_id - 1, new_start_option_id - 1, False
 
-                for question in quiz["questions"]:
-                    # Lưu ID gốc để cập nhật các mối quan hệ
-                    original_question_id = question["id"]
 
-                    # Cập nhật ID câu hỏi
-                    question["id"] = current_question_id
-                    max_question_id = max(max_question_id, current_question_id)
+def id_advance_in_quiz_data(quiz_data):
+    """
+    Số ID câu hỏi và lựa chọn mà adjust_quiz_ids dùng cho dữ liệu đã đọc
 
-                    # Cập nhật mẫu URL hình ảnh để sử dụng ID câu hỏi thay vì số thứ tự
-                    if "image_url" in question and question["image_url"]:
-                        # Thay thế quiz_x_question_y bằng quiz_x_question_id
-                        quiz_id = quiz["id"]
-                        pattern = f"quiz_{quiz_id}_question_\\d+"
-                        replacement = f"quiz_{quiz_id}_question_{current_question_id}"
-                        question["image_url"] = re.sub(
-                            pattern, replacement, question["image_url"]
-                        )
-
-                    # Cập nhật các lựa chọn
-                    if "options" in question:
-                        for option in question["options"]:
-                            # Cập nhật ID lựa chọn
-                            option["id"] = current_option_id
-                            max_option_id = max(max_option_id, current_option_id)
+    Tính bằng chính renumber_quiz_data trên dữ liệu (bị sửa, chỉ dùng để đếm), nên dữ liệu làm
+    adjust_quiz_ids lỗi (ví dụ câu hỏi thiếu "id") cũng làm hàm này ném đúng ngoại lệ đó
 
-                            # Cập nhật tham chiếu question_id trong các lựa chọn
-                            option["question_id"] = current_question_id
+    Returns:
+        tuple: (question_advance, option_advance)
+    """
+    # Bắt đầu từ 1 thì ID lớn nhất chính là số ID đã dùng (ít nhất 1, giống adjust_quiz_ids)
+    max_question_id, max_option_id, _ = renumber_quiz_data(quiz_data, 1, 1)
+    return max_question_id, max_option_id
 
-                            current_option_id += 1
 
-                    current_question_id += 1
+def count_id_advance(file_path):
+    """
+    Đếm số ID câu hỏi và lựa chọn mà adjust_quiz_ids sẽ dùng cho một file
 
-        # Lưu file JSON đã cập nhật
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(quiz_data, f, ensure_ascii=False, indent=4)
+    Đọc file và đánh lại ID thử trong bộ nhớ (id_advance_in_quiz_data), không ghi gì ra đĩa. Lượt ghi
+    cũng phải đọc toàn bộ file nên bộ nhớ cần dùng không tăng thêm
 
-        print(f"Đã cập nhật {file_path} với ID mới:")
-        print(f"- Câu hỏi bắt đầu từ: {new_start_question_id}")
-        print(f"- Lựa chọn bắt đầu từ: {new_start_option_id}")
-        print(f"- URL hình ảnh đã cập nhật để sử dụng ID câu hỏi")
+    Args:
+        file_path (str): Đường dẫn đến file JSON bài kiểm tra
 
-        return max_question_id, max_option_id
+    Returns:
+        tuple: (question_advance, option_advance) - ID bắt đầu của file kế tiếp sẽ tăng thêm bấy nhiêu.
+            (0, 0) nếu file không đọc hoặc không đánh lại ID được, giống lượt chạy tuần tự
+    """
+    try:
+        return id_advance_in_quiz_data(load_json(file_path))
+    except Exception:
+        return 0, 0
 
-    except Exception as e:
-        print(f"Lỗi: {e}")
-        return new_start_question_id - 1, new_start_option_id - 1
+
+def compute_file_offsets(file_paths, new_start_question_id, new_start_option_id, executor=None):
+    """
+    Tính trước ID bắt đầu của từng file, giống hệt khi gọi adjust_quiz_ids lần lượt từng file
+
+    Args:
+        file_paths (list): Danh sách file theo thứ tự xử lý
+        new_start_question_id (int): ID câu hỏi bắt đầu của file đầu tiên
+        new_start_option_id (int): ID lựa chọn bắt đầu của file đầu tiên
+        executor (Executor, optional): Pool dùng để đếm song song
+
+    Returns:
+        tuple: (offsets, next_question_id, next_option_id) với offsets là danh sách
+            (file_path, question_id, option_id)
+    """
+    if executor is None:
+        advances = map(count_id_advance, file_paths)
+    else:
+        advances = executor.map(count_id_advance, file_paths)
+
+    offsets = []
+    question_id = new_start_question_id
+    option_id = new_start_option_id
+    for file_path, (question_advance, option_advance) in zip(file_paths, advances):
+        offsets.append((file_path, question_id, option_id))
+        question_id += question_advance
+        option_id += option_advance
+
+    return offsets, question_id, option_id
+
+
+def _adjust_quiz_ids_task(file_path, new_start_question_id, new_start_option_id, defer_sync=False,
+                          merged_profile=None):
+    """
+    Tác vụ chạy trong process pool: điều chỉnh ID một file
+
+    Args:
+        defer_sync (bool): Không fsync/thay thế file trong tiến trình con mà trả file tạm về
+            để tiến trình cha commit cùng cả thư mục
+        merged_profile (str, optional): Nếu có, các quiz vừa đánh lại ID được chuyển sẵn thành JSON
+            theo kiểu này để tiến trình cha chỉ việc nối vào file merged
+
+    Returns:
+        tuple: (adjusted, file_max_ids, pending, quiz_jsons) với adjusted cho biết file đã được xử lý,
+            file_max_ids là ID lớn nhất thực tế (max_question_id, max_option_id) trong dữ liệu sau khi
+            đánh lại ID, pending là danh sách (file tạm, file đích) chờ commit và quiz_jsons là danh sách
+            JSON của từng quiz. file_max_ids và quiz_jsons là None nếu file không có mảng quizzes
+    """
+    batch = AtomicWriteBatch() if defer_sync else None
+    quiz_data = load_json(file_path)
+    max_question_id, _ = adjust_quiz_ids(
+        file_path, new_start_question_id, new_start_option_id, quiz_data=quiz_data, batch=batch
+    )
+    pending = batch.pending if batch else []
+    adjusted = max_question_id >= new_start_question_id
+    if not (isinstance(quiz_data, dict) and "quizzes" in quiz_data):
+        return adjusted, None, pending, None
+    quiz_jsons = None
+    if merged_profile is not None:
+        quiz_jsons = [json_dumps(quiz, merged_profile) for quiz in quiz_data["quizzes"]]
+    return adjusted, max_ids_in_quiz_data(quiz_data), pending, quiz_jsons
+
+
+def _record_written_file(index, batch, file_path, max_question_id, max_option_id, **merged_info):
+    """Ghi nhận file vào chỉ mục ID, đợi đến khi batch commit nếu file vẫn còn nằm trong batch"""
+    if batch is None:
+        index.record(file_path, max_question_id, max_option_id, **merged_info)
+    else:
+        batch.after_commit(partial(index.record, file_path, max_question_id, max_option_id, **merged_info))
+
+
+def adjust_quiz_ids_parallel(file_paths, new_start_question_id, new_start_option_id, max_workers=None, index=None, batch=None,
+                             writer=None):
+    """
+    Điều chỉnh ID cho nhiều file cùng lúc bằng process pool
+
+    Lượt đầu đếm số câu hỏi/lựa chọn của từng file để tính trước ID bắt đầu (count_id_advance),
+    lượt sau ghi lại tất cả các file song song với ID đã tính. Kết quả giống hệt khi gọi
+    adjust_quiz_ids tuần tự, trừ khi một file đếm được nhưng không ghi lại được (ví dụ lỗi đĩa):
+    khi đó các file sau đã dùng ID khác với lượt chạy tuần tự và một cảnh báo được in ra
+
+    Args:
+        file_paths (list): Danh sách file theo thứ tự xử lý
+        new_start_question_id (int): ID câu hỏi bắt đầu của file đầu tiên
+        new_start_option_id (int): ID lựa chọn bắt đầu của file đầu tiên
+        max_workers (int, optional): Số tiến trình, mặc định bằng số nhân CPU
+        index (QuizIdIndex, optional): Chỉ mục ID để ghi nhận các file vừa được ghi
+        batch (AtomicWriteBatch, optional): Các file được thay thế khi batch commit thay vì trong tiến trình con
+        writer (MergedQuizWriter, optional): Nếu có, các tiến trình con trả về JSON của từng quiz và
+            tiến trình cha nối chúng vào writer theo thứ tự file, không phải đọc lại các file
+
+    Returns:
+        tuple: (max_question_id, max_option_id) thực tế trong các file có mảng quizzes sau khi điều chỉnh
+    """
+    max_question_id = 0
+    max_option_id = 0
+    merged_profile = writer.profile if writer is not None else None
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        offsets, next_question_id, next_option_id = compute_file_offsets(
+            file_paths, new_start_question_id, new_start_option_id, executor
+        )
+        # ID bắt đầu của file kế tiếp theo lượt đếm, để nhận ra file không dùng hết số ID đã tính
+        next_starts = [(question_id, option_id) for _, question_id, option_id in offsets[1:]]
+        next_starts.append((next_question_id, next_option_id))
+
+        futures = [
+            executor.submit(
+                _adjust_quiz_ids_task, file_path, question_id, option_id, batch is not None, merged_profile
+            )
+            for file_path, question_id, option_id in offsets
+        ]
+        for (file_path, question_id, option_id), next_start, future in zip(offsets, next_starts, futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"Lỗi khi xử lý file {file_path}: {e}")
+                result = None
+            # Lượt tuần tự không dùng ID nào cho file không ghi được, còn lượt đếm đã dành ID cho nó
+            if (result is None or not result[0]) and next_start != (question_id, option_id):
+                print(f"Cảnh báo: {file_path} không được ghi lại, ID của các file sau khác với khi chạy tuần tự")
+            if result is None:
+                continue
+            adjusted, file_max_ids, pending, quiz_jsons = result
+            if batch is not None:
+                batch.extend(pending)
+            if file_max_ids is None:
+                print(f"Bỏ qua {os.path.basename(file_path)}: không tìm thấy mảng 'quizzes'")
+                continue
+            if index is not None and adjusted:
+                _record_written_file(index, batch, file_path, *file_max_ids)
+            max_question_id = max(max_question_id, file_max_ids[0])
+            max_option_id = max(max_option_id, file_max_ids[1])
+            if writer is not None:
+                for quiz_json in quiz_jsons:
+                    writer.write_quiz_json(quiz_json)
+
+    return max_question_id, max_option_id
+
+
+def max_ids_in_quiz_data(quiz_data):
+    """
+    Tìm ID lớn nhất của câu hỏi và lựa chọn trong dữ liệu quiz đã đọc vào bộ nhớ
+
+    Args:
+        quiz_data (dict): Dữ liệu JSON của file bài kiểm tra
+
+    Returns:
+        tuple: (max_question_id, max_option_id) trong dữ liệu
+    """
+    max_question_id = 0
+    max_option_id = 0
+
+    for quiz in quiz_data.get("quizzes", []):
+        for question in quiz.get("questions", []):
+            question_id = int(question.get("id", 0))
+            max_question_id = max(max_question_id, question_id)
+
+            for option in question.get("options", []):
+                option_id = int(option.get("id", 0))
+                max_option_id = max(max_option_id, option_id)
+
+    return max_question_id, max_option_id
+
+
+# Token của bộ quét ID: regex tự bỏ qua mọi chuỗi và giá trị không liên quan, chỉ dừng lại ở
+# dấu ngoặc và các khóa "quizzes", "questions", "options", "id" (kèm giá trị số hoặc "[" ngay sau)
+_ID_SCAN_TOKEN = re.compile(
+    rb'[^"\[\]{}]*(?:"(?!(?:quizzes|questions|options|id)"\s*:)[^"\\]*(?:\\.[^"\\]*)*"[^"\[\]{}]*)*'
+    rb'(?:([\[\]{}])|"(quizzes|questions|options|id)"\s*:\s*(\[|-?\d+)?)'
+)
+
+# Kích thước mỗi lần đọc của bộ quét ID
+ID_SCAN_CHUNK_SIZE = 1024 * 1024
+
+# File từ ngưỡng này trở lên được quét dần thay vì đọc hết vào bộ nhớ. File nhỏ hơn
+# được phân tích toàn bộ vì với chúng load_json nhanh hơn và bộ nhớ không đáng kể
+STREAMING_SCAN_MIN_BYTES = 8 * 1024 * 1024
+
+
+def _iter_id_scan_tokens(file_path, chunk_size=ID_SCAN_CHUNK_SIZE):
+    """
+    Đọc file theo từng đoạn và sinh danh sách token (dấu ngoặc, khóa, giá trị) của _ID_SCAN_TOKEN
+    cho mỗi đoạn (theo lô để không phải quay lại generator sau mỗi token)
+
+    File .gz/.zst được giải nén dần. Ném ValueError nếu cuối file còn dữ liệu không phải token
+    """
+    match = _ID_SCAN_TOKEN.match
+
+    with open_input(file_path) as f:
+        data = b""
+        while True:
+            chunk = f.read(chunk_size)
+            final = not chunk
+            data += chunk
+            pos = 0
+            # Token chạm cuối dữ liệu có thể còn tiếp ở đoạn sau (số bị cắt, "[" chưa đọc tới)
+            limit = len(data) - 1
+            tokens = []
+
+            while True:
+                m = match(data, pos)
+                if m is None or (not final and m.end() >= limit):
+                    break
+                pos = m.end()
+                tokens.append(m.groups())
+
+            yield tokens
+            data = data[pos:]
+            if final:
+                break
+
+    if data.strip():
+        raise ValueError(f"File JSON không hoàn chỉnh: {file_path}")
+
+
+def scan_max_ids_streaming(file_path, chunk_size=ID_SCAN_CHUNK_SIZE):
+    """
+    Tìm ID lớn nhất của câu hỏi và lựa chọn bằng cách quét file theo từng đoạn
+
+    Chỉ các giá trị quizzes[].questions[].id và quizzes[].questions[].options[].id được đọc ra,
+    nội dung câu hỏi và lựa chọn không bao giờ được tạo thành đối tượng Python, nên bộ nhớ
+    dùng không phụ thuộc kích thước file. File .gz/.zst được giải nén dần theo từng đoạn
+
+    Args:
+        file_path (str): Đường dẫn đến file JSON
+        chunk_size (int): Số byte đọc mỗi lần
+
+    Returns:
+        tuple: (max_question_id, max_option_id) trong file
+    """
+    max_question_id = 0
+    max_option_id = 0
+    # Ngăn xếp các mảng/đối tượng đang mở: b"{" hoặc b"[", hoặc tên khóa nếu là mảng của khóa đó
+    stack = []
+
+    for tokens in _iter_id_scan_tokens(file_path, chunk_size):
+        for bracket, key, value in tokens:
+            if bracket:
+                if bracket == b"{" or bracket == b"[":
+                    stack.append(bracket)
+                elif stack:
+                    stack.pop()
+                else:
+                    raise ValueError(f"Dấu ngoặc thừa trong {file_path}")
+            elif value == b"[":
+                stack.append(key)
+            elif value and key == b"id":
+                depth = len(stack)
+                if depth == 5 and stack[3] == b"questions" and stack[1] == b"quizzes":
+                    max_question_id = max(max_question_id, int(value))
+                elif (depth == 7 and stack[5] == b"options"
+                      and stack[3] == b"questions" and stack[1] == b"quizzes"):
+                    max_option_id = max(max_option_id, int(value))
+
+    if stack:
+        raise ValueError(f"File JSON không hoàn chỉnh: {file_path}")
+
+    return max_question_id, max_option_id
+
+
+def _scan_max_ids(file_path):
+    """Đọc file và tìm ID lớn nhất, ném ngoại lệ nếu file lỗi"""
+    # Không biết trước kích thước sau giải nén nên file nén luôn được quét dần
+    if compression_for_path(file_path) or os.path.getsize(file_path) >= STREAMING_SCAN_MIN_BYTES:
+        return scan_max_ids_streaming(file_path)
+    quiz_data = load_json(file_path)
+    return max_ids_in_quiz_data(quiz_data)
 
 
 def find_max_ids_in_file(file_path):
@@ -157,34 +656,164 @@ def find_max_ids_in_file(file_path):
         tuple: (max_question_id, max_option_id) trong file
     """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            quiz_data = json.load(f)
-        
-        max_question_id = 0
-        max_option_id = 0
-        
-        for quiz in quiz_data.get("quizzes", []):
-            for question in quiz.get("questions", []):
-                question_id = int(question.get("id", 0))
-                max_question_id = max(max_question_id, question_id)
-                
-                for option in question.get("options", []):
-                    option_id = int(option.get("id", 0))
-                    max_option_id = max(max_option_id, option_id)
-        
-        return max_question_id, max_option_id
+        return _scan_max_ids(file_path)
     
     except Exception as e:
         print(f"Lỗi khi đọc file {file_path}: {e}")
         return 0, 0
 
 
-def find_max_ids_in_directory(directory):
+class QuizIdIndex:
+    """
+    Chỉ mục lưu trên đĩa ID lớn nhất của từng thư mục và từng file quiz
+
+    Mỗi file được ghi lại mtime, kích thước, max_question_id và max_option_id. Khi tra cứu,
+    file chỉ được đọc lại nếu mtime hoặc kích thước đã thay đổi, nên việc tìm ID lớn nhất
+    trên cả cây data/json/quiz chỉ còn là vài lệnh stat
+    """
+
+    FILENAME = ".id_index.json"
+    VERSION = 1
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self.path = os.path.join(base_dir, self.FILENAME)
+        self.folders = {}
+        self._dirty = False
+
+        try:
+            data = load_json(self.path)
+            if data.get("version") == self.VERSION:
+                self.folders = data.get("folders", {})
+        except (OSError, ValueError):
+            # Chưa có chỉ mục hoặc chỉ mục hỏng: bắt đầu lại từ đầu
+            pass
+
+    def _folder_key(self, directory):
+        """Khóa của thư mục: đường dẫn tương đối so với thư mục gốc"""
+        relative_dir = os.path.relpath(os.path.abspath(directory), os.path.abspath(self.base_dir))
+        return relative_dir.replace("\\", "/")
+
+    def _keys(self, file_path):
+        """Trả về (khóa thư mục, tên file) của một file"""
+        return self._folder_key(os.path.dirname(file_path)), os.path.basename(file_path)
+
+    def _folder_entry(self, folder_key):
+        return self.folders.setdefault(
+            folder_key, {"max_question_id": 0, "max_option_id": 0, "files": {}}
+        )
+
+    def record(self, file_path, max_question_id, max_option_id, sources=None, profile=None):
+        """
+        Ghi nhận ID lớn nhất của một file vừa được ghi, không cần đọc lại file
+
+        Với file merged, sources là các file quiz đã được gộp vào nó và profile là kiểu định dạng
+        đã dùng; mtime/kích thước của các file nguồn được lưu lại cho merged_is_current
+        """
+        stat = os.stat(file_path)
+        folder_key, file_name = self._keys(file_path)
+        entry = {
+            "mtime_ns": stat.st_mtime_ns,
+            "size": stat.st_size,
+            "max_question_id": max_question_id,
+            "max_option_id": max_option_id,
+        }
+        if sources is not None:
+            entry["profile"] = profile
+            entry["sources"] = {os.path.basename(path): file_signature(path) for path in sources}
+        self._folder_entry(folder_key)["files"][file_name] = entry
+        self._dirty = True
+
+    def merged_is_current(self, merged_file, sources, profile):
+        """
+        Kiểm tra file merged trên đĩa có đúng là bản đã gộp từ các file nguồn hiện tại không:
+        file merged và mọi file nguồn giữ nguyên mtime/kích thước từ lần ghi trước, cùng kiểu định dạng
+
+        Returns:
+            bool: True nếu không cần ghi lại file merged khi các file nguồn không thay đổi
+        """
+        folder_key, file_name = self._keys(merged_file)
+        entry = self.folders.get(folder_key, {}).get("files", {}).get(file_name)
+        if not entry or entry.get("profile") != profile or "sources" not in entry:
+            return False
+        try:
+            stat = os.stat(merged_file)
+            current_sources = {os.path.basename(path): file_signature(path) for path in sources}
+        except OSError:
+            return False
+        return (entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size
+                and entry["sources"] == current_sources)
+
+    def max_ids_for_file(self, file_path):
+        """
+        Tìm ID lớn nhất trong một file, chỉ đọc lại file nếu mtime/kích thước đã thay đổi
+
+        Returns:
+            tuple: (max_question_id, max_option_id) trong file
+        """
+        stat = os.stat(file_path)
+        folder_key, file_name = self._keys(file_path)
+        entry = self.folders.get(folder_key, {}).get("files", {}).get(file_name)
+        if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            return entry["max_question_id"], entry["max_option_id"]
+
+        try:
+            max_question_id, max_option_id = _scan_max_ids(file_path)
+        except Exception as e:
+            # Không lưu kết quả của file lỗi để lần sau đọc lại
+            print(f"Lỗi khi đọc file {file_path}: {e}")
+            return 0, 0
+
+        self.record(file_path, max_question_id, max_option_id)
+        return max_question_id, max_option_id
+
+    def max_ids_for_directory(self, directory):
+        """
+        Tìm ID lớn nhất trong tất cả các file JSON của thư mục, bỏ khỏi chỉ mục các file đã bị xóa
+
+        Returns:
+            tuple: (max_question_id, max_option_id) trong tất cả các file
+        """
+        json_files = [f for f in os.listdir(directory) if f.endswith(".json")]
+
+        max_question_id = 0
+        max_option_id = 0
+        for file_name in json_files:
+            q_id, o_id = self.max_ids_for_file(os.path.join(directory, file_name))
+            max_question_id = max(max_question_id, q_id)
+            max_option_id = max(max_option_id, o_id)
+
+        # Bỏ các file không còn tồn tại khỏi chỉ mục của thư mục
+        folder = self._folder_entry(self._folder_key(directory))
+        for file_name in set(folder["files"]) - set(json_files):
+            del folder["files"][file_name]
+            self._dirty = True
+
+        return max_question_id, max_option_id
+
+    def save(self):
+        """Lưu chỉ mục xuống đĩa nếu có thay đổi"""
+        if not self._dirty:
+            return
+
+        # Giá trị lớn nhất của mỗi thư mục luôn được tính lại từ các file của nó
+        for folder in self.folders.values():
+            files = folder["files"].values()
+            folder["max_question_id"] = max((f["max_question_id"] for f in files), default=0)
+            folder["max_option_id"] = max((f["max_option_id"] for f in files), default=0)
+
+        with atomic_write(self.path) as f:
+            dump_json({"version": self.VERSION, "folders": self.folders}, f, "compact")
+        self._dirty = False
+
+
+def find_max_ids_in_directory(directory, index=None):
     """
     Tìm ID lớn nhất của câu hỏi và lựa chọn trong tất cả các file JSON trong thư mục
     
     Args:
         directory (str): Đường dẫn đến thư mục chứa các file JSON
+        index (QuizIdIndex, optional): Chỉ mục ID dùng để tránh đọc lại các file không thay đổi
         
     Returns:
         tuple: (max_question_id, max_option_id) trong tất cả các file
@@ -194,6 +823,9 @@ def find_max_ids_in_directory(directory):
     
     if not os.path.exists(directory):
         return max_question_id, max_option_id
+
+    if index is not None:
+        return index.max_ids_for_directory(directory)
     
     # Tìm tất cả file JSON trong thư mục
     json_files = [f for f in os.listdir(directory) if f.endswith(".json")]
@@ -207,13 +839,14 @@ def find_max_ids_in_directory(directory):
     return max_question_id, max_option_id
 
 
-def find_max_ids_in_processed_dirs(base_dir="data/json/quiz", excluded_dirs=None):
+def find_max_ids_in_processed_dirs(base_dir="data/json/quiz", excluded_dirs=None, use_index=True):
     """
     Tìm ID lớn nhất từ các thư mục đã xử lý và các file gộp
     
     Args:
         base_dir (str): Thư mục gốc chứa các thư mục quiz
         excluded_dirs (list): Danh sách các thư mục bị loại trừ (sẽ không tìm ID trong các thư mục này)
+        use_index (bool): Dùng chỉ mục ID trên đĩa, chỉ đọc lại các file đã thay đổi
         
     Returns:
         tuple: (max_question_id, max_option_id) từ tất cả thư mục và file
@@ -223,6 +856,7 @@ def find_max_ids_in_processed_dirs(base_dir="data/json/quiz", excluded_dirs=None
     
     max_question_id = 0
     max_option_id = 0
+    index = QuizIdIndex(base_dir) if use_index else None
     
     # Lấy danh sách tất cả thư mục quiz
     all_quiz_dirs = []
@@ -238,7 +872,7 @@ def find_max_ids_in_processed_dirs(base_dir="data/json/quiz", excluded_dirs=None
     
     print("\nĐang tìm ID lớn nhất từ các thư mục đã xử lý:")
     for quiz_dir in all_quiz_dirs:
-        q_id, o_id = find_max_ids_in_directory(quiz_dir)
+        q_id, o_id = find_max_ids_in_directory(quiz_dir, index)
         if q_id > 0 or o_id > 0:
             print(f"- {os.path.basename(quiz_dir)}: max_question_id={q_id}, max_option_id={o_id}")
             max_question_id = max(max_question_id, q_id)
@@ -246,12 +880,17 @@ def find_max_ids_in_processed_dirs(base_dir="data/json/quiz", excluded_dirs=None
     
     # Tìm trong các file gộp
     merged_files = glob.glob(os.path.join(base_dir, "merged_*_quizzes.json"))
+    for suffix in COMPRESSION_SUFFIXES.values():
+        merged_files += glob.glob(os.path.join(base_dir, f"merged_*_quizzes.json{suffix}"))
     for file_path in merged_files:
-        q_id, o_id = find_max_ids_in_file(file_path)
+        q_id, o_id = index.max_ids_for_file(file_path) if index else find_max_ids_in_file(file_path)
         if q_id > 0 or o_id > 0:
             print(f"- File {os.path.basename(file_path)}: max_question_id={q_id}, max_option_id={o_id}")
             max_question_id = max(max_question_id, q_id)
             max_option_id = max(max_option_id, o_id)
+
+    if index:
+        index.save()
     
     return max_question_id, max_option_id
 
@@ -263,13 +902,14 @@ def get_directory_number(directory_name):
 
 
 # Thêm hàm mới để tìm ID lớn nhất từ thư mục đã xử lý trước đó
-def find_max_ids_in_previous_directory(current_dir_number, quiz_folders):
+def find_max_ids_in_previous_directory(current_dir_number, quiz_folders, use_index=True):
     """
     Tìm ID lớn nhất từ thư mục đã xử lý liền trước theo thứ tự số thư mục
     
     Args:
         current_dir_number (int): Số thứ tự của thư mục đang xử lý
         quiz_folders (list): Danh sách các thư mục quiz đã sắp xếp theo thứ tự số
+        use_index (bool): Dùng chỉ mục ID trên đĩa, chỉ đọc lại các file đã thay đổi
         
     Returns:
         tuple: (max_question_id, max_option_id) từ thư mục liền trước
@@ -289,20 +929,24 @@ def find_max_ids_in_previous_directory(current_dir_number, quiz_folders):
     if current_index > 0:
         previous_dir = sorted_folders[current_index - 1]
         print(f"\nTìm ID từ thư mục liền trước: {os.path.basename(previous_dir)}")
+        base_dir = os.path.dirname(previous_dir)
+        index = QuizIdIndex(base_dir) if use_index else None
         
         # Tìm ID trong thư mục
-        q_id, o_id = find_max_ids_in_directory(previous_dir)
+        q_id, o_id = find_max_ids_in_directory(previous_dir, index)
         
         # Nếu không có file trong thư mục, tìm trong file merged của thư mục đó
         if q_id == 0 and o_id == 0:
-            base_dir = os.path.dirname(previous_dir)
             folder_name = os.path.basename(previous_dir)
-            merged_file = os.path.join(base_dir, f"merged_{folder_name}_quizzes.json")
-            if os.path.exists(merged_file):
-                q_id, o_id = find_max_ids_in_file(merged_file)
+            merged_file = find_merged_file(base_dir, folder_name)
+            if merged_file:
+                q_id, o_id = index.max_ids_for_file(merged_file) if index else find_max_ids_in_file(merged_file)
                 print(f"- File {os.path.basename(merged_file)}: max_question_id={q_id}, max_option_id={o_id}")
         else:
             print(f"- {os.path.basename(previous_dir)}: max_question_id={q_id}, max_option_id={o_id}")
+
+        if index:
+            index.save()
             
         return q_id, o_id
     
@@ -310,88 +954,254 @@ def find_max_ids_in_previous_directory(current_dir_number, quiz_folders):
     return 0, 0
 
 
-if __name__ == "__main__":
-    # Thư mục gốc chứa các thư mục quiz
-    base_directory = os.path.join("data", "json", "quiz")
-    
+def find_quiz_folders(base_directory):
+    """Lấy danh sách các thư mục quiz dạng N_name, sắp xếp theo số thư mục"""
     # Lấy danh sách các thư mục con (1_geography, 4_science_nature, ...)
     quiz_folders = []
     for item in os.listdir(base_directory):
         item_path = os.path.join(base_directory, item)
         if os.path.isdir(item_path) and re.match(r'^\d+_', item) and not item.startswith("backup"):
             quiz_folders.append(item_path)
-    
+
     # Sắp xếp thư mục theo số (1_geography trước 4_science_nature)
     quiz_folders.sort(key=get_directory_number)
-    
-    if not quiz_folders:
-        print("Không tìm thấy thư mục quiz nào để xử lý.")
-        exit()
-    
-    try:
-        for i, directory_path in enumerate(quiz_folders):
-            folder_name = os.path.basename(directory_path)
-            print(f"\n{'='*50}")
-            print(f"Đang xử lý thư mục {i+1}/{len(quiz_folders)}: {folder_name}")
-            print(f"{'='*50}")
-            
-            # Lấy tất cả file JSON trong thư mục
-            json_files = [f for f in os.listdir(directory_path) if f.endswith(".json")]
-            
-            # Sắp xếp file theo thứ tự bảng chữ cái
-            json_files.sort()
-            
-            if not json_files:
-                print(f"Không có file JSON nào trong thư mục {folder_name}")
+    return quiz_folders
+
+
+def prompt_start_ids(folder_name):
+    """Hỏi người dùng ID bắt đầu cho câu hỏi và lựa chọn của file đầu tiên"""
+    question_id = int(input("Nhập ID bắt đầu cho câu hỏi của file đầu tiên: "))
+    option_id = int(input("Nhập ID bắt đầu cho lựa chọn của file đầu tiên: "))
+    return question_id, option_id
+
+
+def _renumber_folder_sequential(directory_path, json_files, output_file, question_id, option_id, index, stats, batch=None,
+                                merged_profile=MERGED_OUTPUT_PROFILE):
+    """
+    Đánh lại ID các file trong một thư mục theo thứ tự, mỗi file chỉ đọc một lần:
+    dữ liệu vừa đánh lại ID được ghi lại vào file và nối luôn vào file merged
+
+    Nếu chỉ mục cho biết file merged vẫn là bản gộp từ đúng các file hiện tại, file merged chỉ được
+    mở để ghi khi có file đầu tiên thay đổi (các file trước đó được đọc lại từ đĩa để nối vào);
+    khi không file nào thay đổi, file merged và thư mục không bị ghi hay đồng bộ lại
+
+    Returns:
+        tuple: (max_question_id, max_option_id) thực tế trong các file của thư mục sau khi ghi
+    """
+    file_paths = [os.path.join(directory_path, file_name) for file_name in json_files]
+    merged_max_question_id = 0
+    merged_max_option_id = 0
+    # Các file đã gộp trong lúc chưa mở file merged, đọc lại nếu phải ghi file merged
+    unwritten_paths = []
+
+    with ExitStack() as stack:
+        writer = None
+        if not index.merged_is_current(output_file, file_paths, merged_profile):
+            writer = stack.enter_context(MergedQuizWriter(output_file, batch, merged_profile))
+
+        for j, (file_name, file_path) in enumerate(zip(json_files, file_paths)):
+            print(f"\nĐang xử lý file {j+1}/{len(json_files)}: {file_name}")
+            print(f"Sử dụng ID câu hỏi bắt đầu: {question_id}, ID lựa chọn: {option_id}")
+
+            try:
+                quiz_data = load_json(file_path)
+            except Exception as e:
+                print(f"Lỗi khi đọc file {file_path}: {e}")
                 continue
-                
-            # Thư mục đầu tiên (1_geography) hoặc thư mục chỉ định nhập thủ công
-            if i == 0 or folder_name == "1_geography":
-                # Yêu cầu ID ban đầu cho file đầu tiên
-                question_id = int(input("Nhập ID bắt đầu cho câu hỏi của file đầu tiên: "))
-                option_id = int(input("Nhập ID bắt đầu cho lựa chọn của file đầu tiên: "))
+            stats["files"] += 1
+            stats["bytes_parsed"] += os.path.getsize(file_path)
+
+            # Điều chỉnh ID trên dữ liệu đã đọc và lấy ID lớn nhất
+            max_question_id, max_option_id, written = _adjust_quiz_ids(
+                file_path, question_id, option_id, quiz_data=quiz_data, batch=batch
+            )
+
+            # adjust_quiz_ids trả về ID bắt đầu - 1 nếu không ghi lại được file
+            adjusted = max_question_id >= question_id
+
+            # Đặt ID bắt đầu cho file tiếp theo
+            question_id = max_question_id + 1
+            option_id = max_option_id + 1
+
+            if not (isinstance(quiz_data, dict) and "quizzes" in quiz_data):
+                print(f"Bỏ qua {file_name}: không tìm thấy mảng 'quizzes'")
+                continue
+
+            # File đầu tiên thay đổi: file merged cũ không còn đúng, ghi lại từ đầu
+            if writer is None and written:
+                writer = stack.enter_context(MergedQuizWriter(output_file, batch, merged_profile))
+                for unwritten_path in unwritten_paths:
+                    stats["bytes_parsed"] += os.path.getsize(unwritten_path)
+                    for quiz in load_json(unwritten_path)["quizzes"]:
+                        writer.write_quiz(quiz)
+
+            # Gộp ngay dữ liệu vừa ghi vào file merged của thư mục
+            if writer is None:
+                unwritten_paths.append(file_path)
             else:
-                # Lấy số thứ tự của thư mục hiện tại
-                current_dir_number = get_directory_number(directory_path)
-                
-                # Tìm ID lớn nhất từ thư mục liền trước theo thứ tự số
-                max_question_id, max_option_id = find_max_ids_in_previous_directory(current_dir_number, quiz_folders)
-                
-                question_id = max_question_id + 1
-                option_id = max_option_id + 1
-                print(f"ID cao nhất từ thư mục xử lý trước đó: question_id={max_question_id}, option_id={max_option_id}")
-                print(f"Tự động sử dụng ID bắt đầu: question_id={question_id}, option_id={option_id}")
-            
-            print(f"\nĐã tìm thấy {len(json_files)} file JSON để xử lý.")
-            
-            # Xử lý từng file theo thứ tự
-            for j, file_name in enumerate(json_files):
-                file_path = os.path.join(directory_path, file_name)
-                print(f"\nĐang xử lý file {j+1}/{len(json_files)}: {file_name}")
-                print(f"Sử dụng ID câu hỏi bắt đầu: {question_id}, ID lựa chọn: {option_id}")
-                
-                # Điều chỉnh ID và lấy ID lớn nhất
-                max_question_id, max_option_id = adjust_quiz_ids(
-                    file_path, question_id, option_id
-                )
-                
-                # Đặt ID bắt đầu cho file tiếp theo
-                question_id = max_question_id + 1
-                option_id = max_option_id + 1
-                
-                if j < len(json_files) - 1:
-                    print(f"File tiếp theo sẽ bắt đầu với ID câu hỏi: {question_id}, ID lựa chọn: {option_id}")
-            
-            # Gộp các file trong thư mục hiện tại
-            output_file = os.path.join(base_directory, f"merged_{folder_name}_quizzes.json")
-            merged_file = merge_quiz_jsons(directory_path, output_file)
+                for quiz in quiz_data["quizzes"]:
+                    writer.write_quiz(quiz)
+
+            # Cập nhật chỉ mục ID từ dữ liệu trong bộ nhớ, không cần đọc lại file
+            file_max_question_id, file_max_option_id = max_ids_in_quiz_data(quiz_data)
+            if adjusted:
+                _record_written_file(index, batch, file_path, file_max_question_id, file_max_option_id)
+            merged_max_question_id = max(merged_max_question_id, file_max_question_id)
+            merged_max_option_id = max(merged_max_option_id, file_max_option_id)
+
+    if writer is None:
+        print(f"\nKhông có file nào thay đổi, giữ nguyên file merged: {output_file}")
+    else:
+        print(f"\nĐã gộp {writer.quiz_count} bài kiểm tra vào file: {output_file}")
+        _record_written_file(index, batch, output_file, merged_max_question_id, merged_max_option_id,
+                             sources=file_paths, profile=merged_profile)
+    return merged_max_question_id, merged_max_option_id
+
+
+def _renumber_folder_parallel(directory_path, json_files, output_file, question_id, option_id, index, stats, workers, batch=None,
+                              merged_profile=MERGED_OUTPUT_PROFILE):
+    """
+    Đánh lại ID các file trong một thư mục bằng process pool. Các tiến trình con trả về JSON của
+    từng quiz đã đánh lại ID, tiến trình cha chỉ nối chúng vào file merged theo thứ tự file
+
+    Returns:
+        tuple: (max_question_id, max_option_id) thực tế trong các file của thư mục sau khi ghi
+    """
+    file_paths = [os.path.join(directory_path, file_name) for file_name in json_files]
+    print(f"Xử lý song song {len(file_paths)} file với {workers} tiến trình")
+
+    # Lượt đếm và lượt ghi mỗi lượt đọc file gốc một lần
+    stats["files"] += len(file_paths)
+    stats["bytes_parsed"] += 2 * sum(os.path.getsize(path) for path in file_paths)
+
+    with MergedQuizWriter(output_file, batch, merged_profile) as writer:
+        folder_max_ids = adjust_quiz_ids_parallel(
+            file_paths, question_id, option_id, max_workers=workers, index=index, batch=batch, writer=writer
+        )
+
+    print(f"\nĐã gộp {writer.quiz_count} bài kiểm tra vào file: {output_file}")
+    _record_written_file(index, batch, output_file, *folder_max_ids, sources=file_paths, profile=merged_profile)
+    return folder_max_ids
+
+
+# Số file tối thiểu trong một thư mục để đáng dùng process pool
+PARALLEL_MIN_FILES = 32
+
+
+def renumber_quiz_tree(base_directory, ask_start_ids=prompt_start_ids, workers=1, batch_durability=False,
+                       merged_profile=MERGED_OUTPUT_PROFILE, merged_compression=None):
+    """
+    Đánh lại ID cho toàn bộ cây thư mục quiz trong một lượt duy nhất
+
+    Các thư mục N_name được xử lý theo thứ tự get_directory_number. Bộ đếm ID câu hỏi/lựa chọn
+    được truyền tiếp trong bộ nhớ từ file này sang file sau; thư mục sau bắt đầu từ ID lớn nhất
+    thực sự đã ghi trong thư mục trước + 1 (giống script cũ vốn đọc lại thư mục trước, kể cả khi
+    file cuối không có câu hỏi), lấy từ dữ liệu vừa ghi nên không cần đọc lại thư mục.
+    Nếu thư mục trước không có câu hỏi/lựa chọn nào thì giữ nguyên ID bắt đầu của nó. Mỗi file chỉ được đọc đúng một lần:
+    dữ liệu vừa đánh lại ID được ghi lại vào file, đồng thời được nối luôn vào merged_*_quizzes.json
+
+    Args:
+        base_directory (str): Thư mục gốc chứa các thư mục quiz (data/json/quiz)
+        ask_start_ids (callable): Hàm nhận tên thư mục, trả về (question_id, option_id) bắt đầu
+            cho thư mục đầu tiên hoặc thư mục 1_geography
+        workers (int): Số tiến trình cho các thư mục có từ PARALLEL_MIN_FILES file trở lên.
+            Khi lớn hơn 1, các thư mục này được xử lý bằng adjust_quiz_ids_parallel
+        batch_durability (bool): Mọi file được ghi qua file tạm; nếu bật, các file tạm của một thư mục
+            được đồng bộ và thay thế cùng lúc khi xong thư mục: trên Linux một lệnh syncfs cho cả thư mục
+            (nơi khác vẫn fdatasync từng file tạm) và thư mục chỉ fsync một lần, thay vì fsync sau mỗi file
+        merged_profile (str): Kiểu định dạng của các file merged_*_quizzes.json ("compact" hoặc "pretty").
+            Các file quiz trong thư mục luôn được ghi "pretty" vì được sửa tay
+        merged_compression (str, optional): "gzip" hoặc "zstd" để ghi merged_*_quizzes.json.gz/.zst
+
+    Returns:
+        dict: Thống kê gồm số thư mục, số file, tổng số byte đã đọc và thời gian xử lý
+    """
+    quiz_folders = find_quiz_folders(base_directory)
+    stats = {"folders": 0, "files": 0, "bytes_parsed": 0, "elapsed": 0.0}
+
+    if not quiz_folders:
+        print("Không tìm thấy thư mục quiz nào để xử lý.")
+        return stats
+
+    start_time = time.perf_counter()
+    index = QuizIdIndex(base_directory)
+    question_id = None
+    option_id = None
+
+    for i, directory_path in enumerate(quiz_folders):
+        folder_name = os.path.basename(directory_path)
+        print(f"\n{'='*50}")
+        print(f"Đang xử lý thư mục {i+1}/{len(quiz_folders)}: {folder_name}")
+        print(f"{'='*50}")
+
+        # Lấy tất cả file JSON trong thư mục, sắp xếp theo thứ tự bảng chữ cái
+        json_files = sorted(f for f in os.listdir(directory_path) if f.endswith(".json"))
+        output_file = merged_file_path(base_directory, folder_name, merged_compression)
+
+        if not json_files:
+            print(f"Không có file JSON nào trong thư mục {folder_name}")
+            # Thư mục đã được gộp và dọn trống trước đó: lấy ID tiếp theo từ file merged của nó
+            merged_file = find_merged_file(base_directory, folder_name)
             if merged_file:
-                print(f"Đã hoàn tất quá trình gộp file thư mục {folder_name}.")
+                max_question_id, max_option_id = index.max_ids_for_file(merged_file)
+                if max_question_id > 0 or max_option_id > 0:
+                    question_id = max_question_id + 1
+                    option_id = max_option_id + 1
+            continue
+
+        # Thư mục đầu tiên (1_geography) hoặc thư mục chỉ định nhập thủ công
+        if i == 0 or folder_name == "1_geography" or question_id is None:
+            question_id, option_id = ask_start_ids(folder_name)
+        else:
+            print(f"Tự động sử dụng ID bắt đầu: question_id={question_id}, option_id={option_id}")
+
+        print(f"\nĐã tìm thấy {len(json_files)} file JSON để xử lý.")
+
+        batch = AtomicWriteBatch() if batch_durability else None
+        with batch if batch is not None else nullcontext():
+            if workers > 1 and len(json_files) >= PARALLEL_MIN_FILES:
+                max_question_id, max_option_id = _renumber_folder_parallel(
+                    directory_path, json_files, output_file, question_id, option_id, index, stats, workers, batch,
+                    merged_profile
+                )
             else:
-                print(f"Gộp file thư mục {folder_name} không thành công.")
-        
+                max_question_id, max_option_id = _renumber_folder_sequential(
+                    directory_path, json_files, output_file, question_id, option_id, index, stats, batch,
+                    merged_profile
+                )
+        # Thư mục kế tiếp bắt đầu sau ID lớn nhất đã ghi, không phải sau bộ đếm: bộ đếm vượt lên 1
+        # khi file cuối không có câu hỏi/lựa chọn (adjust_quiz_ids trả về ID bắt đầu làm ID lớn nhất)
+        if max_question_id > 0:
+            question_id = max_question_id + 1
+        if max_option_id > 0:
+            option_id = max_option_id + 1
+        stats["folders"] += 1
+
+    index.save()
+    stats["elapsed"] = time.perf_counter() - start_time
+    elapsed = max(stats["elapsed"], 1e-9)
+    print(f"\n{'='*50}")
+    print(f"Đã xử lý {stats['files']} file trong {stats['folders']} thư mục, {stats['elapsed']:.2f} giây")
+    print(f"- Tốc độ: {stats['files'] / elapsed:.1f} file/giây")
+    print(f"- Tổng dung lượng đã đọc: {stats['bytes_parsed'] / (1024 * 1024):.2f} MB "
+          f"({stats['bytes_parsed'] / (1024 * 1024) / elapsed:.2f} MB/giây)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Đánh lại ID câu hỏi/lựa chọn và gộp các thư mục trong data/json/quiz")
+    # Mặc định tuần tự: chế độ song song chưa được đo trên máy nhiều nhân
+    parser.add_argument("--workers", type=int, default=1,
+                        help=f"Số tiến trình cho thư mục có từ {PARALLEL_MIN_FILES} file trở lên (mặc định: 1)")
+    args = parser.parse_args()
+
+    # Thư mục gốc chứa các thư mục quiz
+    base_directory = os.path.join("data", "json", "quiz")
+
+    try:
+        renumber_quiz_tree(base_directory, workers=args.workers, batch_durability=True)
         print("\nĐã xử lý tất cả các thư mục quiz thành công!")
-        
+
     except ValueError:
         print("Vui lòng nhập giá trị số nguyên hợp lệ cho ID.")
     except Exception as e:
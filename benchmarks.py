@@ -0,0 +1,880 @@
+import argparse
+import glob
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+def make_quiz(quiz_id, question_count, first_question_id=1, first_option_id=1, options_per_question=4):
+    """Tạo một quiz giả lập có cấu trúc giống dữ liệu thật trong data/json/quiz"""
+    questions = []
+    option_id = first_option_id
+    for i in range(question_count):
+        question_id = first_question_id + i
+        options = []
+        for j in range(options_per_question):
+            options.append({
+                "id": option_id,
+                "question_id": question_id,
+                "content": f"Lựa chọn {j + 1} của câu hỏi {question_id} — đáp án tiếng Việt",
+                "is_correct": j == 0,
+            })
+            option_id += 1
+        questions.append({
+            "id": question_id,
+            "quiz_id": quiz_id,
+            "content": f"Câu hỏi số {i + 1}: đây là cầu thủ nào trong bức ảnh?",
+            "image_url": f"question_images/quiz_{quiz_id}_question_{i + 1}_1745400000.jpg",
+            "audio_url": None,
+            "time_limit": 10,
+            "points": 1000,
+            "order_number": i + 1,
+            "type": "QUIZ",
+            "options": options,
+        })
+    return {
+        "id": quiz_id,
+        "title": f"Bài kiểm tra {quiz_id}",
+        "description": "Mô tả bài kiểm tra giả lập",
+        "quiz_thumbnails": f"quiz_thumbnails/quiz_thumbnail_{quiz_id}_1745400000.jpg",
+        "category_id": 1,
+        "creator_id": 1,
+        "difficulty": "MEDIUM",
+        "is_public": True,
+        "play_count": 0,
+        "question_count": question_count,
+        "questions": questions,
+    }
+
+
+def make_quiz_folder(folder_path, file_count, questions_per_file, first_quiz_id=1):
+    """Tạo thư mục chứa file_count file quiz JSON, mỗi file một quiz"""
+    os.makedirs(folder_path, exist_ok=True)
+    for i in range(file_count):
+        quiz_id = first_quiz_id + i
+        quiz = make_quiz(quiz_id, questions_per_file)
+        file_path = os.path.join(folder_path, f"quiz_{quiz_id:04d}.json")
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump({"quizzes": [quiz]}, f, ensure_ascii=False, indent=4)
+    return folder_path
+
+
+def make_category_data(quiz_count, questions_per_quiz, category_id=1):
+    """Tạo dữ liệu một danh mục giả lập giống data/json/category (đầu vào của generate_sql_inserts)"""
+    quizzes = []
+    for i in range(quiz_count):
+        quiz = make_quiz(
+            i + 1, questions_per_quiz, i * questions_per_quiz + 1, i * questions_per_quiz * 4 + 1
+        )
+        quiz["category_id"] = category_id
+        quiz["favorite_count"] = 0
+        quizzes.append(quiz)
+    return {
+        "categories": [{
+            "id": category_id,
+            "name": f"Danh mục {category_id}",
+            "description": "Mô tả danh mục giả lập, có dấu nháy ' để kiểm tra escape",
+            "icon_url": f"category_icons/category_{category_id}.png",
+            "quiz_count": quiz_count,
+            "total_play_count": 0,
+            "is_active": True,
+        }],
+        "quizzes": quizzes,
+    }
+
+
+def load_sql_into_sqlite(sql_content):
+    """Nạp một file SQL của generate_sql_inserts vào SQLite trong bộ nhớ, trả về (thời gian, kết nối)"""
+    import sqlite3
+
+    from db_loader import SQLITE_SCHEMA
+
+    connection = sqlite3.connect(":memory:", isolation_level=None)
+    # Bật khóa ngoại để kiểm tra thứ tự chèn giữa các bảng
+    connection.execute("PRAGMA foreign_keys = ON")
+    connection.executescript(SQLITE_SCHEMA)
+    # SQLite không có cú pháp START TRANSACTION
+    sql_content = sql_content.replace("START TRANSACTION;", "BEGIN;")
+    start = time.perf_counter()
+    connection.executescript(sql_content)
+    return time.perf_counter() - start, connection
+
+
+# In ra peak RSS (KB) của tiến trình hiện tại. Trên Linux đọc VmHWM vì ru_maxrss
+# được giữ nguyên qua execve và sẽ mang theo peak của tiến trình cha
+_PEAK_RSS_SNIPPET = """
+import resource, sys
+try:
+    with open("/proc/self/status") as _status:
+        print(next(int(line.split()[1]) for line in _status if line.startswith("VmHWM:")))
+except OSError:
+    _rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(_rss // 1024 if sys.platform == "darwin" else _rss)
+"""
+
+
+# Đặt lại peak RSS về RSS hiện tại (chỉ có trên Linux), để chỉ đo phần code chạy sau đó
+_RESET_PEAK_RSS_SNIPPET = """
+try:
+    with open("/proc/self/clear_refs", "w") as _clear_refs:
+        _clear_refs.write("5")
+except OSError:
+    pass
+"""
+
+
+def _run_measured(code):
+    """Chạy đoạn code trong một tiến trình Python mới, trả về (thời gian, peak RSS tính bằng MB)"""
+    wrapped = (
+        "import sys\n"
+        f"sys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+        f"{code}\n"
+        f"{_PEAK_RSS_SNIPPET}"
+    )
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-c", wrapped], capture_output=True, text=True, check=True
+    )
+    elapsed = time.perf_counter() - start
+    peak_kb = int(result.stdout.strip().splitlines()[-1])
+    return elapsed, peak_kb / 1024
+
+
+def bench_merge(sizes=(50, 200, 800), questions_per_file=50):
+    """So sánh peak RSS của merge_quiz_jsons giữa chế độ streaming và chế độ cũ"""
+    print("merge_quiz_jsons: peak RSS theo số file trong thư mục")
+    print(f"{'files':>8} {'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            folder = make_quiz_folder(os.path.join(tmp, f"{size}_bench"), size, questions_per_file)
+            outputs = {}
+            for streaming in (False, True):
+                output_file = os.path.join(tmp, f"merged_{size}_{streaming}.json")
+                code = (
+                    "import contextlib, io\n"
+                    "from adjust_quiz_ids import merge_quiz_jsons\n"
+                    "with contextlib.redirect_stdout(io.StringIO()):\n"
+                    f"    merge_quiz_jsons({folder!r}, {output_file!r}, streaming={streaming})"
+                )
+                elapsed, peak = _run_measured(code)
+                mode = "streaming" if streaming else "legacy"
+                print(f"{size:>8} {mode:>10} {elapsed:>10.2f} {peak:>14.1f}")
+                with open(output_file, "rb") as f:
+                    outputs[streaming] = f.read()
+            if outputs[True] != outputs[False]:
+                print("  !! Kết quả streaming khác chế độ cũ")
+
+
+def bench_parallel_adjust(file_count=400, questions_per_file=50):
+    """So sánh adjust_quiz_ids tuần tự với adjust_quiz_ids_parallel theo số tiến trình"""
+    import contextlib
+    import io
+    import shutil
+    from adjust_quiz_ids import adjust_quiz_ids, adjust_quiz_ids_parallel
+
+    print(f"adjust_quiz_ids: {file_count} file x {questions_per_file} câu hỏi")
+    print(f"{'mode':>14} {'time (s)':>10} {'file/s':>10}")
+    worker_counts = sorted({2, 4, os.cpu_count() or 1} - {1})
+    with tempfile.TemporaryDirectory() as tmp:
+        source = make_quiz_folder(os.path.join(tmp, "source"), file_count, questions_per_file)
+        results = {}
+        for workers in [1] + worker_counts:
+            folder = os.path.join(tmp, f"run_{workers}")
+            shutil.copytree(source, folder)
+            file_paths = sorted(
+                os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".json")
+            )
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                if workers == 1:
+                    question_id, option_id = 1, 1
+                    for file_path in file_paths:
+                        max_question_id, max_option_id = adjust_quiz_ids(file_path, question_id, option_id)
+                        question_id, option_id = max_question_id + 1, max_option_id + 1
+                else:
+                    adjust_quiz_ids_parallel(file_paths, 1, 1, max_workers=workers)
+            elapsed = time.perf_counter() - start
+            mode = "sequential" if workers == 1 else f"{workers} workers"
+            print(f"{mode:>14} {elapsed:>10.2f} {file_count / elapsed:>10.1f}")
+
+            contents = []
+            for file_path in file_paths:
+                with open(file_path, "rb") as f:
+                    contents.append(f.read())
+            results[workers] = contents
+        if any(contents != results[1] for contents in results.values()):
+            print("  !! Kết quả song song khác kết quả tuần tự")
+
+
+def _legacy_renumber_image_urls(quiz_data, new_start_question_id):
+    """Cách cập nhật image_url cũ: dựng và tra cache regex cho từng câu hỏi"""
+    import re
+
+    for quiz in quiz_data["quizzes"]:
+        current_question_id = new_start_question_id
+        for question in quiz["questions"]:
+            quiz_id = quiz["id"]
+            pattern = f"quiz_{quiz_id}_question_\\d+"
+            replacement = f"quiz_{quiz_id}_question_{current_question_id}"
+            question["image_url"] = re.sub(pattern, replacement, question["image_url"])
+            current_question_id += 1
+
+
+def _precompiled_renumber_image_urls(quiz_data, new_start_question_id):
+    """Cách cập nhật image_url hiện tại trong renumber_quiz_data: một regex đã biên dịch cho mỗi quiz"""
+    import re
+
+    for quiz in quiz_data["quizzes"]:
+        current_question_id = new_start_question_id
+        image_url_pattern = re.compile(f"quiz_{quiz['id']}_question_\\d+")
+        image_url_prefix = f"quiz_{quiz['id']}_question_"
+        for question in quiz["questions"]:
+            question["image_url"] = image_url_pattern.sub(
+                image_url_prefix + str(current_question_id), question["image_url"]
+            )
+            current_question_id += 1
+
+
+def bench_image_url(question_count=100_000, repeat=5):
+    """Micro-benchmark cập nhật image_url trên một file giả lập 100k câu hỏi"""
+    import copy
+    from adjust_quiz_ids import renumber_quiz_data
+
+    source = {"quizzes": [make_quiz(56, question_count, options_per_question=0)]}
+    print(f"Cập nhật image_url cho {question_count} câu hỏi (tốt nhất trong {repeat} lần)")
+    print(f"{'variant':>28} {'time (s)':>10} {'question/s':>12}")
+
+    outputs = {}
+    variants = (
+        ("legacy re.sub", _legacy_renumber_image_urls),
+        ("precompiled per quiz", _precompiled_renumber_image_urls),
+        ("renumber_quiz_data (full)", lambda data, start: renumber_quiz_data(data, start, 1)),
+    )
+    for name, func in variants:
+        best = float("inf")
+        for _ in range(repeat):
+            quiz_data = copy.deepcopy(source)
+            start = time.perf_counter()
+            func(quiz_data, 1000)
+            best = min(best, time.perf_counter() - start)
+        outputs[name] = [q["image_url"] for q in quiz_data["quizzes"][0]["questions"]]
+        print(f"{name:>28} {best:>10.3f} {question_count / best:>12.0f}")
+
+    if len({tuple(urls) for urls in outputs.values()}) != 1:
+        print("  !! Các cách cập nhật cho kết quả khác nhau")
+
+
+def bench_output_profiles(quiz_count=200, questions_per_quiz=50, repeat=3):
+    """So sánh kích thước và thời gian ghi/đọc một file merged giữa profile pretty và compact"""
+    import contextlib
+    import io
+    from adjust_quiz_ids import MergedQuizWriter
+
+    quizzes = [make_quiz(i + 1, questions_per_quiz) for i in range(quiz_count)]
+    print(f"File merged: {quiz_count} quiz x {questions_per_quiz} câu hỏi (tốt nhất trong {repeat} lần)")
+    print(f"{'profile':>10} {'size (MB)':>10} {'write (s)':>10} {'read (s)':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        loaded = {}
+        for profile in ("pretty", "compact"):
+            output_file = os.path.join(tmp, f"merged_{profile}.json")
+            write_time = read_time = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    with MergedQuizWriter(output_file, profile=profile) as writer:
+                        for quiz in quizzes:
+                            writer.write_quiz(quiz)
+                write_time = min(write_time, time.perf_counter() - start)
+
+                start = time.perf_counter()
+                with open(output_file, "r", encoding="utf-8") as f:
+                    loaded[profile] = json.load(f)
+                read_time = min(read_time, time.perf_counter() - start)
+            size = os.path.getsize(output_file) / (1024 * 1024)
+            print(f"{profile:>10} {size:>10.2f} {write_time:>10.3f} {read_time:>10.3f}")
+        if loaded["pretty"] != loaded["compact"]:
+            print("  !! Dữ liệu đọc lại của hai profile khác nhau")
+
+
+def _largest_merged_file(base_directory="data/json/quiz"):
+    """Trả về file merged_*_quizzes.json lớn nhất trong dữ liệu thật, hoặc None nếu không có"""
+    candidates = glob.glob(os.path.join(base_directory, "merged_*_quizzes.json"))
+    return max(candidates, key=os.path.getsize, default=None)
+
+
+def bench_json_backends(quiz_count=200, questions_per_quiz=50, repeat=3):
+    """So sánh backend orjson và json chuẩn trên file merged lớn nhất (hoặc một file giả lập)"""
+    import io_utils
+
+    if io_utils.orjson is None:
+        print("Chưa cài orjson: chỉ đo được thư viện json chuẩn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = _largest_merged_file()
+        if file_path is None:
+            file_path = os.path.join(tmp, "merged_bench_quizzes.json")
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump(
+                    {"quizzes": [make_quiz(i + 1, questions_per_quiz) for i in range(quiz_count)]},
+                    f, ensure_ascii=False, indent=4,
+                )
+        with open(file_path, "rb") as f:
+            raw = f.read()
+
+        print(f"{file_path}: {len(raw) / (1024 * 1024):.2f} MB (tốt nhất trong {repeat} lần)")
+        print(f"{'backend':>8} {'load (s)':>10} {'pretty (s)':>11} {'compact (s)':>12}")
+
+        backends = ["json"] + (["orjson"] if io_utils.orjson is not None else [])
+        saved_orjson = io_utils.orjson
+        outputs = {}
+        try:
+            for backend in backends:
+                io_utils.orjson = saved_orjson if backend == "orjson" else None
+                timings = []
+                for func in (
+                    lambda: io_utils.json_loads(raw),
+                    lambda: io_utils.json_dumps(data, "pretty"),
+                    lambda: io_utils.json_dumps(data, "compact"),
+                ):
+                    best = float("inf")
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        result = func()
+                        best = min(best, time.perf_counter() - start)
+                    if not timings:
+                        data = result
+                    timings.append(best)
+                    outputs.setdefault(backend, []).append(result)
+                print(f"{backend:>8} {timings[0]:>10.3f} {timings[1]:>11.3f} {timings[2]:>12.3f}")
+        finally:
+            io_utils.orjson = saved_orjson
+
+        if any(result != outputs["json"] for result in outputs.values()):
+            print("  !! Kết quả của các backend khác nhau")
+
+
+def bench_max_id_scan(quiz_count=400, questions_per_quiz=50):
+    """So sánh thời gian và peak RSS khi tìm ID lớn nhất: phân tích toàn bộ file và quét dần"""
+    from adjust_quiz_ids import max_ids_in_quiz_data, scan_max_ids_streaming
+    from io_utils import load_json
+
+    print(f"Tìm ID lớn nhất trong file merged {quiz_count} quiz x {questions_per_quiz} câu hỏi")
+    print(f"{'profile':>10} {'size (MB)':>10} {'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        quizzes = [
+            make_quiz(i + 1, questions_per_quiz, i * questions_per_quiz + 1, i * questions_per_quiz * 4 + 1)
+            for i in range(quiz_count)
+        ]
+        for profile, options in (("pretty", {"indent": 4}), ("compact", {"separators": (",", ":")})):
+            file_path = os.path.join(tmp, f"merged_{profile}_quizzes.json")
+            with open(file_path, "w", encoding="utf-8") as f:
+                json.dump({"quizzes": quizzes}, f, ensure_ascii=False, **options)
+            size = os.path.getsize(file_path) / (1024 * 1024)
+
+            for mode, call in (
+                ("full", "max_ids_in_quiz_data(load_json(path))"),
+                ("streaming", "scan_max_ids_streaming(path)"),
+            ):
+                code = (
+                    "from adjust_quiz_ids import max_ids_in_quiz_data, scan_max_ids_streaming\n"
+                    "from io_utils import load_json\n"
+                    f"path = {file_path!r}\n"
+                    f"{call}"
+                )
+                elapsed, peak = _run_measured(code)
+                print(f"{profile:>10} {size:>10.2f} {mode:>10} {elapsed:>10.2f} {peak:>14.1f}")
+            if scan_max_ids_streaming(file_path) != max_ids_in_quiz_data(load_json(file_path)):
+                print("  !! Hai cách cho kết quả khác nhau")
+
+
+def bench_sql_batch(quiz_count=100, questions_per_quiz=50, batch_sizes=(None, 100, 500, 1000)):
+    """So sánh thời gian nạp SQL vào SQLite giữa INSERT từng dòng và INSERT nhiều dòng"""
+    from generate_sql_inserts import generate_inserts
+
+    json_data = make_category_data(quiz_count, questions_per_quiz)
+    print(f"generate_inserts: {quiz_count} quiz x {questions_per_quiz} câu hỏi, nạp vào SQLite")
+    print(f"{'batch':>8} {'statements':>11} {'size (MB)':>10} {'generate (s)':>13} {'load (s)':>10}")
+    counts = set()
+    for batch_size in batch_sizes:
+        start = time.perf_counter()
+        sql_content = "\n".join(generate_inserts(json_data, batch_size=batch_size))
+        generate_time = time.perf_counter() - start
+        load_time, connection = load_sql_into_sqlite(sql_content)
+        counts.add(tuple(
+            connection.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("category", "quiz", "quiz_category", "question", "question_option")
+        ))
+        connection.close()
+        statements = sql_content.count("INSERT INTO")
+        size = len(sql_content.encode("utf-8")) / (1024 * 1024)
+        label = batch_size or "1 row"
+        print(f"{label:>8} {statements:>11} {size:>10.2f} {generate_time:>13.3f} {load_time:>10.3f}")
+    if len(counts) != 1:
+        print("  !! Số dòng nạp vào khác nhau giữa các chế độ")
+
+
+def bench_sql_stream(sizes=(50, 200, 800), questions_per_quiz=50):
+    """So sánh peak RSS khi ghi file SQL: nối thành một chuỗi rồi ghi và ghi dần từng câu lệnh"""
+    print("generate_inserts + save_sql: peak RSS theo số quiz trong danh mục (tính từ sau khi đọc JSON)")
+    print(f"{'quizzes':>8} {'mode':>10} {'time (s)':>10} {'peak RSS (MB)':>14} {'SQL (MB)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            json_path = os.path.join(tmp, f"category_{size}.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(make_category_data(size, questions_per_quiz), f, ensure_ascii=False)
+            outputs = {}
+            for mode, content in (
+                ("join", '"\\n".join(generate_inserts(json_data, batch_size=500))'),
+                ("streaming", "generate_inserts(json_data, batch_size=500)"),
+            ):
+                output_path = os.path.join(tmp, f"category_{size}_{mode}.sql")
+                code = (
+                    "from generate_sql_inserts import generate_inserts, save_sql\n"
+                    "from io_utils import load_json\n"
+                    f"json_data = load_json({json_path!r})\n"
+                    f"{_RESET_PEAK_RSS_SNIPPET}\n"
+                    f"save_sql({content}, {output_path!r})"
+                )
+                elapsed, peak = _run_measured(code)
+                sql_size = os.path.getsize(output_path) / (1024 * 1024)
+                print(f"{size:>8} {mode:>10} {elapsed:>10.2f} {peak:>14.1f} {sql_size:>9.1f}")
+                with open(output_path, "rb") as f:
+                    outputs[mode] = f.read()
+            if outputs["join"] != outputs["streaming"]:
+                print("  !! Kết quả ghi dần khác kết quả nối chuỗi")
+
+
+def bench_db_loader(category_count=4, quiz_count=50, questions_per_quiz=50, worker_counts=(1, 4)):
+    """Đo tốc độ nạp trực tiếp bằng db_loader vào một file SQLite theo số luồng"""
+    import contextlib
+    import io
+    from db_loader import load_categories, print_load_report, sqlite_connector
+
+    print(f"db_loader: {category_count} danh mục x {quiz_count} quiz x {questions_per_quiz} câu hỏi vào SQLite")
+    with tempfile.TemporaryDirectory() as tmp:
+        json_paths = []
+        for i in range(category_count):
+            json_data = make_category_data(quiz_count, questions_per_quiz, category_id=i + 1)
+            # Mỗi danh mục dùng một khoảng ID riêng
+            for quiz in json_data["quizzes"]:
+                quiz["id"] += i * quiz_count
+                for question in quiz["questions"]:
+                    question["id"] += i * quiz_count * questions_per_quiz
+                    question["quiz_id"] = quiz["id"]
+                    for option in question["options"]:
+                        option["id"] += i * quiz_count * questions_per_quiz * 4
+                        option["question_id"] = question["id"]
+            json_path = os.path.join(tmp, f"category_{i + 1}.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(json_data, f, ensure_ascii=False)
+            json_paths.append(json_path)
+
+        for workers in worker_counts:
+            database_path = os.path.join(tmp, f"quiz_{workers}.db")
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                totals = load_categories(json_paths, sqlite_connector(database_path), workers=workers)
+            elapsed = time.perf_counter() - start
+            print(f"\n{workers} luồng:", end="")
+            print_load_report(totals, elapsed)
+
+
+def bench_sql_render(quiz_count=200, questions_per_quiz=50, batch_size=500, repeat=5):
+    """Đo số dòng/giây khi viết các dòng thành câu lệnh INSERT, theo từng bảng và cho cả generate_inserts"""
+    from generate_sql_inserts import TABLE_ORDER, format_insert, generate_inserts, iter_rows
+
+    json_data = make_category_data(quiz_count, questions_per_quiz)
+    # Thêm nháy đơn và gạch chéo ngược để đo cả nhánh escape
+    json_data["quizzes"][0]["title"] = "Quiz 'đặc biệt' C:\\temp"
+    rows = {table: [] for table in TABLE_ORDER}
+    for table, row in iter_rows(json_data):
+        rows[table].append(row)
+
+    def best_of(func):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    print(f"format_insert: {quiz_count} quiz x {questions_per_quiz} câu hỏi, lô {batch_size} dòng, tốt nhất trong {repeat} lần")
+    print(f"{'table':>18} {'rows':>8} {'time (s)':>10} {'rows/s':>12}")
+    for table in TABLE_ORDER:
+        table_rows = rows[table]
+        if not table_rows:
+            continue
+        elapsed = best_of(lambda: [
+            format_insert(table, table_rows[i:i + batch_size]) for i in range(0, len(table_rows), batch_size)
+        ])
+        print(f"{table:>18} {len(table_rows):>8} {elapsed:>10.3f} {len(table_rows) / elapsed:>12.0f}")
+
+    total_rows = sum(len(table_rows) for table_rows in rows.values())
+    elapsed = best_of(lambda: sum(1 for _ in generate_inserts(json_data, batch_size=batch_size)))
+    print(f"{'generate_inserts':>18} {total_rows:>8} {elapsed:>10.3f} {total_rows / elapsed:>12.0f}")
+
+
+def bench_compression(category_count=4, quiz_count=100, questions_per_quiz=50):
+    """So sánh kích thước và thời gian ghi/đọc file SQL gộp và file JSON khi không nén, gzip và zstd"""
+    from generate_sql_inserts import convert_category_file, merge_sql_files
+    from io_utils import atomic_write, compressed_path, dump_json, load_json, open_input, zstandard
+
+    compressions = [None, "gzip"] + (["zstd"] if zstandard is not None else [])
+    if zstandard is None:
+        print("(bỏ qua zstd: chưa cài zstandard)")
+    print(f"{category_count} danh mục x {quiz_count} quiz x {questions_per_quiz} câu hỏi")
+    print(f"{'artifact':>10} {'compression':>12} {'size (MB)':>10} {'write (s)':>10} {'read (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        json_paths = []
+        for i in range(category_count):
+            json_path = os.path.join(tmp, f"{i + 1}_category.json")
+            with open(json_path, "w", encoding="utf-8") as f:
+                json.dump(make_category_data(quiz_count, questions_per_quiz, i + 1), f, ensure_ascii=False)
+            json_paths.append(json_path)
+
+        for compression in compressions:
+            output_directory = os.path.join(tmp, f"sql_{compression}")
+            os.makedirs(output_directory)
+            merged_file = compressed_path(os.path.join(output_directory, "merged_sql.sql"), compression)
+            start = time.perf_counter()
+            for json_path in json_paths:
+                convert_category_file(json_path, output_directory, compression=compression)
+            merge_sql_files(output_directory, merged_file)
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            with open_input(merged_file) as f:
+                for _ in iter(lambda: f.read(1024 * 1024), b""):
+                    pass
+            read_time = time.perf_counter() - start
+            size = os.path.getsize(merged_file) / (1024 * 1024)
+            label = compression or "none"
+            print(f"{'sql':>10} {label:>12} {size:>10.2f} {write_time:>10.3f} {read_time:>9.3f}")
+
+        data = load_json(json_paths[0])
+        for compression in compressions:
+            json_path = compressed_path(os.path.join(tmp, "merged_quizzes.json"), compression)
+            start = time.perf_counter()
+            with atomic_write(json_path) as f:
+                dump_json(data, f, "compact")
+            write_time = time.perf_counter() - start
+            start = time.perf_counter()
+            load_json(json_path)
+            read_time = time.perf_counter() - start
+            size = os.path.getsize(json_path) / (1024 * 1024)
+            label = compression or "none"
+            print(f"{'json':>10} {label:>12} {size:>10.2f} {write_time:>10.3f} {read_time:>9.3f}")
+
+
+def bench_upload(file_count=200, latency=0.05, worker_counts=(1, 4, 16), failure_rate=0.05):
+    """Đo uploads/giây và độ trễ p50/p95 của cloudinary_upload với hàm upload giả lập (không cần mạng)"""
+    import contextlib
+    import io
+    import random
+    import threading
+
+    from cloudinary_upload import percentile, upload_preserve_folder_structure
+
+    # Cùng tên lớp với cloudinary.exceptions: SDK chỉ ném lớp lỗi kèm thông báo, không kèm mã HTTP
+    class Error(Exception):
+        pass
+
+    class RateLimited(Error):
+        pass
+
+    class GeneralError(Error):
+        pass
+
+    class BadRequest(Error):
+        pass
+
+    print(f"cloudinary_upload: {file_count} ảnh, mỗi lần upload giả lập {latency * 1000:.0f} ms, "
+          f"{failure_rate:.0%} lần lỗi tạm thời (GeneralError/RateLimited), 1% ảnh hỏng (BadRequest, không thử lại)")
+    print(f"{'workers':>8} {'uploaded':>9} {'time (s)':>9} {'uploads/s':>10} {'p50 (s)':>8} {'p95 (s)':>8} {'retried':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        broken = set()
+        for i in range(file_count):
+            folder = os.path.join(tmp, f"quiz_{i // 50}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"quiz_{i // 50}_question_{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(b"\xff\xd8\xff")
+            if i % 100 == 99:
+                broken.add(path)
+
+        for workers in worker_counts:
+            rng = random.Random(workers)
+            lock = threading.Lock()
+
+            def stub_upload(local_path, public_id, folder, **options):
+                time.sleep(latency)
+                with lock:
+                    roll = rng.random()
+                if local_path in broken:
+                    raise BadRequest("Invalid image file")
+                if roll < failure_rate:
+                    if roll < failure_rate / 4:
+                        raise RateLimited("Rate Limit Exceeded")
+                    raise GeneralError("Internal Server Error")
+                return {"secure_url": f"https://stub.invalid/{folder}/{public_id}"}
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                results = upload_preserve_folder_structure(
+                    tmp, workers, stub_upload, base_delay=latency, skip_unchanged=False
+                )
+            elapsed = time.perf_counter() - start
+
+            uploaded = [result for result in results if result["error"] is None]
+            latencies = [result["seconds"] for result in uploaded]
+            retried = sum(1 for result in results if result["attempts"] > 1)
+            print(f"{workers:>8} {len(uploaded):>9} {elapsed:>9.2f} {len(uploaded) / elapsed:>10.1f} "
+                  f"{percentile(latencies, 0.5):>8.3f} {percentile(latencies, 0.95):>8.3f} {retried:>8}")
+
+
+def bench_upload_rerun(file_count=2000, changed_count=5):
+    """Đo lần chạy lại cloudinary_upload: cây không đổi (không gọi upload lần nào) và khi vài file thay đổi"""
+    import contextlib
+    import io
+
+    from cloudinary_upload import upload_preserve_folder_structure
+
+    calls = []
+
+    def stub_upload(local_path, public_id, folder, **options):
+        calls.append(local_path)
+        return {"secure_url": f"https://stub.invalid/{folder}/{public_id}"}
+
+    print(f"cloudinary_upload với manifest: {file_count} ảnh, hàm upload giả lập")
+    print(f"{'run':>22} {'upload calls':>13} {'time (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(file_count):
+            folder = os.path.join(tmp, f"quiz_{i // 50}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"quiz_{i // 50}_question_{i}.jpg")
+            with open(path, "wb") as f:
+                f.write(os.urandom(2048))
+            paths.append(path)
+
+        def run(label):
+            calls.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                upload_preserve_folder_structure(tmp, 16, stub_upload)
+            print(f"{label:>22} {len(calls):>13} {time.perf_counter() - start:>9.3f}")
+
+        run("first run")
+        run("unchanged")
+        # Chỉ chạm mtime: phải băm lại nhưng không upload
+        for path in paths[:changed_count]:
+            os.utime(path)
+        run(f"{changed_count} touched")
+        for path in paths[-changed_count:]:
+            with open(path, "ab") as f:
+                f.write(b"x")
+        run(f"{changed_count} modified")
+
+
+def bench_preprocess(image_count=24, size=(3000, 2000), bandwidth_mb=10):
+    """So sánh số byte và thời gian upload (giả lập băng thông) khi gửi ảnh gốc và ảnh đã tiền xử lý (cần Pillow)"""
+    import contextlib
+    import io
+
+    try:
+        from PIL import Image, ImageFilter
+    except ImportError:
+        print("Bỏ qua: chưa cài Pillow")
+        return
+
+    from cloudinary_upload import preprocess_images, upload_preserve_folder_structure
+
+    def stub_upload(local_path, public_id, folder, **options):
+        # Thời gian gửi tỷ lệ với kích thước file
+        time.sleep(os.path.getsize(local_path) / (bandwidth_mb * 1024 * 1024))
+        return {"secure_url": f"https://stub.invalid/{folder}/{public_id}"}
+
+    print(f"Tiền xử lý {image_count} ảnh JPEG {size[0]}x{size[1]}, upload giả lập {bandwidth_mb} MB/s, 4 luồng")
+    with tempfile.TemporaryDirectory() as tmp:
+        root = os.path.join(tmp, "upload")
+        os.makedirs(os.path.join(root, "question_images"))
+        local_paths = []
+        for i in range(image_count):
+            # Ảnh giống ảnh chụp: nền chuyển màu mượt cộng nhiễu đã làm mờ
+            image = Image.linear_gradient("L").resize(size).convert("RGB")
+            noise = Image.effect_noise(size, 40 + i).filter(ImageFilter.GaussianBlur(2)).convert("RGB")
+            image = Image.blend(image, noise, 0.5)
+            path = os.path.join(root, "question_images", f"quiz_1_question_{i}.jpg")
+            image.save(path, quality=92)
+            local_paths.append(path)
+
+        cache = os.path.join(tmp, "cache")
+        for label in ("cold cache", "warm cache"):
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                preprocess_images(local_paths, cache)
+            print(f"  preprocess ({label}, {os.cpu_count()} tiến trình): {time.perf_counter() - start:.2f} s")
+
+        print(f"{'mode':>12} {'upload (MB)':>12} {'time (s)':>9}")
+        for preprocess in (False, True):
+            calls = []
+
+            def counting_upload(local_path, **options):
+                calls.append(os.path.getsize(local_path))
+                return stub_upload(local_path, **options)
+
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                upload_preserve_folder_structure(
+                    root, 4, counting_upload, skip_unchanged=False, preprocess=preprocess, cache_folder=cache
+                )
+            label = "webp" if preprocess else "original"
+            print(f"{label:>12} {sum(calls) / 1024 / 1024:>12.1f} {time.perf_counter() - start:>9.2f}")
+
+
+def bench_dedupe(unique_count=300, copy_count=150, reencoded_count=150, latency=0.02):
+    """So sánh số lần upload và thời gian khi bật khử trùng lặp ảnh (exact, và perceptual nếu có Pillow)"""
+    import contextlib
+    import io
+    import random
+    import shutil
+
+    from cloudinary_upload import upload_preserve_folder_structure
+    from io_utils import load_json
+
+    try:
+        from PIL import Image, ImageFilter
+    except ImportError:
+        Image = None
+
+    calls = []
+
+    def stub_upload(local_path, public_id, folder, **options):
+        time.sleep(latency)
+        calls.append(local_path)
+        return {"secure_url": f"https://stub.invalid/{folder}/{public_id}"}
+
+    modes = [None, "exact"] + (["perceptual"] if Image else [])
+    if Image is None:
+        reencoded_count = 0
+        print("Chưa cài Pillow: chỉ đo chế độ exact")
+    print(f"cloudinary_upload --dedupe: {unique_count} ảnh khác nhau, {copy_count} bản sao y hệt, "
+          f"{reencoded_count} bản nén lại/thu nhỏ; upload giả lập {latency * 1000:.0f} ms, 8 luồng")
+    print(f"{'dedupe':>11} {'upload calls':>13} {'unique URLs':>12} {'time (s)':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        rng = random.Random(0)
+        originals = []
+        for i in range(unique_count):
+            folder = os.path.join(tmp, f"quiz_{i // 50}")
+            os.makedirs(folder, exist_ok=True)
+            path = os.path.join(folder, f"quiz_{i // 50}_question_{i}.jpg")
+            if Image:
+                Image.effect_noise((320, 240), 60).filter(ImageFilter.GaussianBlur(3)).convert("RGB").save(path)
+            else:
+                with open(path, "wb") as f:
+                    f.write(os.urandom(4096))
+            originals.append(path)
+
+        copies = os.path.join(tmp, "copies")
+        os.makedirs(copies)
+        for i in range(copy_count):
+            shutil.copy(rng.choice(originals), os.path.join(copies, f"copy_{i}.jpg"))
+        for i in range(reencoded_count):
+            with Image.open(rng.choice(originals)) as image:
+                image.resize((240, 180)).save(os.path.join(copies, f"reencoded_{i}.jpg"), quality=70)
+
+        for mode in modes:
+            calls.clear()
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                upload_preserve_folder_structure(tmp, 8, stub_upload, skip_unchanged=False, dedupe=mode)
+            elapsed = time.perf_counter() - start
+            url_map = load_json(os.path.join(tmp, "image_url_map.json"))
+            print(f"{mode or 'off':>11} {len(calls):>13} {len(set(url_map.values())):>12} {elapsed:>9.2f}")
+
+
+def bench_resume(file_count=400, latency=0.02, kill_fraction=0.5, workers=8):
+    """Đo thời gian chạy lại cloudinary_upload sau khi tiến trình bị giết giữa chừng, có và không có journal"""
+    print(f"cloudinary_upload: {file_count} ảnh, upload giả lập {latency * 1000:.0f} ms, {workers} luồng, "
+          f"tiến trình bị giết sau {kill_fraction:.0%} số ảnh")
+    print(f"{'restart':>16} {'upload calls':>13} {'time (s)':>9}")
+    # Manifest chỉ lưu khi kết thúc, để chỉ journal giữ được tiến độ của lần chạy bị giết
+    code = """
+import contextlib, io, os, sys, threading, time
+sys.path.insert(0, {package!r})
+import cloudinary_upload
+cloudinary_upload.UploadManifest.SAVE_EVERY = 10 ** 9
+lock = threading.Lock()
+calls = []
+def stub_upload(local_path, public_id, folder, **options):
+    time.sleep({latency!r})
+    with lock:
+        calls.append(local_path)
+        if len(calls) == {kill_after!r}:
+            os._exit(9)
+    return {{"secure_url": f"https://stub.invalid/{{folder}}/{{public_id}}"}}
+with contextlib.redirect_stdout(io.StringIO()):
+    cloudinary_upload.upload_preserve_folder_structure({root!r}, {workers!r}, stub_upload)
+print(len(calls))
+"""
+    package = os.path.dirname(os.path.abspath(__file__))
+
+    def run(root, kill_after=-1):
+        start = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code.format(
+                package=package, latency=latency, kill_after=kill_after, root=root, workers=workers
+            )],
+            capture_output=True, text=True,
+        )
+        return result.stdout.strip(), time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for journal in (False, True):
+            root = os.path.join(tmp, f"journal_{journal}")
+            for i in range(file_count):
+                folder = os.path.join(root, f"quiz_{i // 50}")
+                os.makedirs(folder, exist_ok=True)
+                with open(os.path.join(folder, f"quiz_{i // 50}_question_{i}.jpg"), "wb") as f:
+                    f.write(os.urandom(2048))
+            run(root, int(file_count * kill_fraction))
+            if not journal:
+                os.remove(os.path.join(root, ".cloudinary_journal.jsonl"))
+            calls, elapsed = run(root)
+            print(f"{'journal' if journal else 'from scratch':>16} {calls:>13} {elapsed:>9.2f}")
+
+
+BENCHMARKS = {
+    "merge": bench_merge,
+    "parallel": bench_parallel_adjust,
+    "image_url": bench_image_url,
+    "profiles": bench_output_profiles,
+    "json_backend": bench_json_backends,
+    "max_id_scan": bench_max_id_scan,
+    "sql_batch": bench_sql_batch,
+    "sql_stream": bench_sql_stream,
+    "db_loader": bench_db_loader,
+    "sql_render": bench_sql_render,
+    "compression": bench_compression,
+    "upload": bench_upload,
+    "upload_rerun": bench_upload_rerun,
+    "preprocess": bench_preprocess,
+    "dedupe": bench_dedupe,
+    "resume": bench_resume,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark các bước xử lý dữ liệu quiz")
+    parser.add_argument("names", nargs="*", help=f"Tên benchmark cần chạy: {', '.join(BENCHMARKS)} (mặc định: tất cả)")
+    args = parser.parse_args()
+
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"Không có benchmark: {', '.join(unknown)}")
+
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
+        print()
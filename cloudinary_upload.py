@@ -1,28 +1,76 @@
+import argparse
 import os
-from dotenv import load_dotenv
-import cloudinary
-from cloudinary.uploader import upload
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
-# Load environment variables
-load_dotenv()
+from io_utils import atomic_write, dump_json, json_dumps, json_loads, load_json, sha256_file
 
-# Configure Cloudinary
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
-    api_key=os.getenv("CLOUDINARY_API_KEY"),
-    api_secret=os.getenv("CLOUDINARY_API_SECRET"),
-)
+ROOT_FOLDER = "upload"  # Folder at the same level as the script
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
 
+# Number of uploads in flight at the same time
+UPLOAD_WORKERS = 8
 
-def upload_preserve_folder_structure():
-    root_folder = "upload"  # Folder at the same level as the script
+# Retry policy: attempt n waits RETRY_BASE_DELAY * 2**(n-1) seconds (plus jitter), at most RETRY_MAX_DELAY
+UPLOAD_RETRIES = 4
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 60.0
 
+# cloudinary.uploader raises cloudinary.exceptions.<class>(message) chosen from the HTTP status, without
+# the status itself, so failures are classified by class name (cloudinary is only imported when uploading).
+# RateLimited (420/429) pauses every thread; these client errors fail at once, everything else
+# (GeneralError, plain Error("Socket error ...") and network errors) is retried
+RATE_LIMIT_ERRORS = ("RateLimited",)
+FINAL_UPLOAD_ERRORS = ("BadRequest", "AuthorizationRequired", "NotAllowed", "NotFound", "AlreadyExists")
+
+# Optional local preprocessing (needs Pillow): shrink to fit PREPROCESS_MAX_DIMENSION and re-encode as WebP.
+# The cache lives outside ROOT_FOLDER so cached files are never picked up as images to upload
+PREPROCESS_CACHE_FOLDER = "upload_cache"
+PREPROCESS_MAX_DIMENSION = 1280
+PREPROCESS_QUALITY = 80
+PREPROCESS_FORMAT = "webp"
+
+# Perceptual dedup: besides a close dHash, look-alike images must have the same aspect ratio and
+# near-identical colours (every channel of an 8x8 thumbnail within THUMBNAIL_MAX_DIFFERENCE), so that
+# similar but different flags such as Chad and Romania are never merged
+DHASH_MAX_DISTANCE = 8
+THUMBNAIL_MAX_DIFFERENCE = 12
+
+# Mapping {path relative to the upload folder: secure_url}, written into the upload folder after each run
+IMAGE_URL_MAP_FILE = "image_url_map.json"
+
+
+def configure_cloudinary():
+    """Configure Cloudinary from the environment (.env) and return its upload function"""
+    from dotenv import load_dotenv
+    import cloudinary
+    from cloudinary.uploader import upload
+
+    # Load environment variables
+    load_dotenv()
+
+    # Configure Cloudinary
+    cloudinary.config(
+        cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+        api_key=os.getenv("CLOUDINARY_API_KEY"),
+        api_secret=os.getenv("CLOUDINARY_API_SECRET"),
+    )
+    return upload
+
+
+def iter_upload_jobs(root_folder=ROOT_FOLDER):
+    """
+    Yield (local_path, relative_path, public_id, folder) for every image under root_folder
+
+    The Cloudinary folder mirrors the local sub-folder and the public_id is the file name
+    without its extension.
+    """
     for root, _, files in os.walk(root_folder):
-        image_files = [
-            f for f in files if f.lower().endswith((".png", ".jpg", ".jpeg", ".webp"))
-        ]
+        image_files = [f for f in files if f.lower().endswith(IMAGE_EXTENSIONS)]
 
-        for file in image_files:
+        for file in sorted(image_files):
             local_path = os.path.join(root, file)
 
             # Get relative path and convert backslashes to forward slashes
@@ -31,24 +79,835 @@ def upload_preserve_folder_structure():
             filename_without_ext = os.path.splitext(os.path.basename(local_path))[0]
 
             # Use only filename as public_id
-            public_id = filename_without_ext
+            yield local_path, relative_path, filename_without_ext, parent_dir
 
-            print(f"Processing: {relative_path}")
 
+def _error_class_names(error):
+    """Names of the exception class and its bases"""
+    return {cls.__name__ for cls in type(error).__mro__}
+
+
+def is_rate_limited(error):
+    """True if the upload failed because the account is being rate limited"""
+    return not _error_class_names(error).isdisjoint(RATE_LIMIT_ERRORS)
+
+
+def is_retryable(error):
+    """Rate limits, server errors and network errors are retried; bad files and bad credentials are not"""
+    return _error_class_names(error).isdisjoint(FINAL_UPLOAD_ERRORS)
+
+
+class RateLimitGate:
+    """
+    Pause shared by all upload threads
+
+    When one upload is rate limited, every thread waits until the pause is over before starting its
+    next request, instead of each thread hammering the API with its own retries.
+    """
+
+    def __init__(self, sleep=time.sleep, clock=time.monotonic):
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+        self._sleep = sleep
+        self._clock = clock
+
+    def pause(self, seconds):
+        """Hold all threads for at least `seconds` from now"""
+        with self._lock:
+            self._resume_at = max(self._resume_at, self._clock() + seconds)
+
+    def wait(self):
+        """Block until no pause is active"""
+        while True:
+            with self._lock:
+                remaining = self._resume_at - self._clock()
+            if remaining <= 0:
+                return
+            self._sleep(remaining)
+
+
+def retry_delay(attempt, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+    """Exponential backoff with full jitter for the given (1-based) failed attempt"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** (attempt - 1)))
+
+
+def upload_file(upload_func, local_path, public_id, folder, retries=UPLOAD_RETRIES, gate=None,
+                base_delay=RETRY_BASE_DELAY, sleep=time.sleep):
+    """
+    Upload one image, retrying transient failures with exponential backoff
+
+    Args:
+        upload_func (callable): cloudinary.uploader.upload or a stub with the same signature
+        local_path (str): Image to upload
+        public_id (str): Cloudinary public_id
+        folder (str): Cloudinary folder
+        retries (int): Extra attempts after the first one
+        gate (RateLimitGate, optional): Shared pause honoured before every attempt
+        base_delay (float): Backoff before the first retry, doubled on every further retry
+        sleep (callable): Used for backoff, replaceable for offline tests
+
+    Returns:
+        dict: path, public_id, folder, url, error, attempts and seconds (wall time including retries)
+    """
+    start = time.perf_counter()
+    attempt = 0
+    while True:
+        attempt += 1
+        if gate is not None:
+            gate.wait()
+        try:
+            result = upload_func(
+                local_path,
+                public_id=public_id,
+                resource_type="image",
+                overwrite=True,
+                quality="auto",
+                folder=folder,
+            )
+            return {
+                "path": local_path, "public_id": public_id, "folder": folder, "url": result["secure_url"],
+                "error": None, "attempts": attempt, "seconds": time.perf_counter() - start,
+            }
+        except Exception as e:
+            if attempt > retries or not is_retryable(e):
+                return {
+                    "path": local_path, "public_id": public_id, "folder": folder, "url": None,
+                    "error": str(e), "attempts": attempt, "seconds": time.perf_counter() - start,
+                }
+            delay = retry_delay(attempt, base_delay)
+            if is_rate_limited(e) and gate is not None:
+                # Slow everyone down, not just this thread
+                gate.pause(delay)
+            else:
+                sleep(delay)
+
+
+def preprocess_variant(max_dimension=PREPROCESS_MAX_DIMENSION, quality=PREPROCESS_QUALITY):
+    """Name of a preprocessing setting, used in cache file names and stored in the upload manifest"""
+    return f"{PREPROCESS_FORMAT}-{max_dimension}-q{quality}"
+
+
+def preprocess_image(local_path, cache_folder=PREPROCESS_CACHE_FOLDER, max_dimension=PREPROCESS_MAX_DIMENSION,
+                     quality=PREPROCESS_QUALITY):
+    """
+    Shrink one image to fit max_dimension and re-encode it as WebP in the cache folder
+
+    The cache file is named after the SHA-256 of the source and the preprocessing setting, so an
+    unchanged source is never re-encoded. If the re-encoded file is not smaller than the source
+    (already small or well compressed), the source itself is uploaded. Runs in a worker process.
+
+    Returns:
+        tuple: (path to upload, source bytes, upload bytes)
+    """
+    from PIL import Image, ImageOps
+
+    source_size = os.path.getsize(local_path)
+    cache_path = os.path.join(
+        cache_folder, f"{sha256_file(local_path)}_{preprocess_variant(max_dimension, quality)}.{PREPROCESS_FORMAT}"
+    )
+    if not os.path.exists(cache_path):
+        with Image.open(local_path) as image:
+            # Apply the camera orientation before resizing, the EXIF tag is not kept
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+            if image.mode not in ("RGB", "RGBA"):
+                has_alpha = "A" in image.getbands() or "transparency" in image.info
+                image = image.convert("RGBA" if has_alpha else "RGB")
+            with atomic_write(cache_path, "wb") as f:
+                image.save(f, format="WEBP", quality=quality, method=4)
+
+    cache_size = os.path.getsize(cache_path)
+    if cache_size >= source_size:
+        return local_path, source_size, source_size
+    return cache_path, source_size, cache_size
+
+
+def preprocess_images(local_paths, cache_folder=PREPROCESS_CACHE_FOLDER, max_dimension=PREPROCESS_MAX_DIMENSION,
+                      quality=PREPROCESS_QUALITY, workers=None):
+    """
+    Run preprocess_image for many images on a process pool (one process per core by default)
+
+    Returns:
+        dict: {local_path: (path to upload, source bytes, upload bytes)}. Images that cannot be
+            processed keep their original file
+    """
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ImportError("Image preprocessing needs Pillow (pip install Pillow)") from None
+
+    os.makedirs(cache_folder, exist_ok=True)
+    prepared = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(preprocess_image, local_path, cache_folder, max_dimension, quality): local_path
+            for local_path in local_paths
+        }
+        for future in as_completed(futures):
+            local_path = futures[future]
             try:
-                print(f"Uploading with public_id: '{public_id}', folder: '{parent_dir}'")
-                result = upload(
-                    local_path,
-                    public_id=public_id,
-                    resource_type="image",
-                    overwrite=True,
-                    quality="auto",
-                    folder=parent_dir,
-                )
-                print(f"✅ Uploaded: {local_path} → {result['secure_url']}")
+                prepared[local_path] = future.result()
             except Exception as e:
-                print(f"❌ Failed to upload {local_path}: {str(e)}")
+                print(f"⚠️ Could not preprocess {local_path}, uploading the original: {e}")
+                size = os.path.getsize(local_path)
+                prepared[local_path] = (local_path, size, size)
+    return prepared
+
+
+def image_fingerprint(local_path):
+    """
+    Perceptual fingerprint of an image (needs Pillow)
+
+    Returns:
+        tuple: (aspect ratio rounded to 2 decimals, 64-bit dHash, 8x8 RGB thumbnail as bytes)
+    """
+    from PIL import Image
+
+    with Image.open(local_path) as image:
+        aspect = round(image.width / image.height, 2)
+        # JPEG can be decoded directly at a fraction of its size
+        image.draft("RGB", (64, 64))
+        gray = image.convert("L").resize((9, 8), Image.LANCZOS).tobytes()
+        thumbnail = image.convert("RGB").resize((8, 8), Image.LANCZOS).tobytes()
+
+    # dHash: one bit per pixel, set if it is brighter than its right neighbour
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            bits = bits << 1 | (gray[row * 9 + col] > gray[row * 9 + col + 1])
+    return aspect, bits, thumbnail
+
+
+def _image_fingerprint_or_none(local_path):
+    """image_fingerprint, or None for files Pillow cannot read (they are only deduplicated exactly)"""
+    try:
+        return image_fingerprint(local_path)
+    except Exception:
+        return None
+
+
+def _upload_priority(local_path):
+    """Sort key choosing which copy of a duplicate group is uploaded: the largest file, then the first path"""
+    return -os.path.getsize(local_path), local_path
+
+
+def find_duplicates(local_paths, sha256_of=sha256_file, perceptual=False, workers=None):
+    """
+    Group duplicate images and pick the one copy of each group that gets uploaded
+
+    Exact duplicates have the same SHA-256. With perceptual=True, images that differ only in
+    encoding or resolution are grouped too (dHash within DHASH_MAX_DISTANCE bits, same aspect ratio
+    and near-identical thumbnail colours); fingerprints are computed on a process pool.
+
+    Args:
+        local_paths (list): Images to compare
+        sha256_of (callable): Returns the SHA-256 of a path (lets the upload manifest reuse known hashes)
+        perceptual (bool): Also group visually identical images (needs Pillow)
+        workers (int, optional): Processes for perceptual fingerprints (default: one per core)
+
+    Returns:
+        dict: {local_path: local path of the copy that is uploaded for it} for every image
+    """
+    by_sha = {}
+    for local_path in local_paths:
+        by_sha.setdefault(sha256_of(local_path), []).append(local_path)
+
+    representatives = {}
+    for paths in by_sha.values():
+        representative = min(paths, key=_upload_priority)
+        for local_path in paths:
+            representatives[local_path] = representative
+    if not perceptual:
+        return representatives
+
+    try:
+        import PIL  # noqa: F401
+    except ImportError:
+        raise ImportError("Perceptual dedup needs Pillow (pip install Pillow)") from None
+
+    candidates = sorted(set(representatives.values()), key=_upload_priority)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        fingerprints = dict(zip(candidates, executor.map(_image_fingerprint_or_none, candidates, chunksize=16)))
+
+    # Greedy clustering in upload priority order, so each cluster is represented by its largest image
+    clusters = {}
+    merged = {}
+    for local_path in candidates:
+        if fingerprints[local_path] is None:
+            continue
+        aspect, bits, thumbnail = fingerprints[local_path]
+        for representative, representative_bits, representative_thumbnail in clusters.setdefault(aspect, []):
+            if (bin(bits ^ representative_bits).count("1") <= DHASH_MAX_DISTANCE
+                    and max(abs(a - b) for a, b in zip(thumbnail, representative_thumbnail))
+                    <= THUMBNAIL_MAX_DIFFERENCE):
+                merged[local_path] = representative
+                break
+        else:
+            clusters[aspect].append((local_path, bits, thumbnail))
+
+    return {local_path: merged.get(representative, representative)
+            for local_path, representative in representatives.items()}
+
+
+def _iter_questions(quiz):
+    """Questions of a quiz, in the flat layout or grouped as [{"questions": [...]}, ...]"""
+    questions = quiz.get("questions", [])
+    if isinstance(questions, list) and questions and all(
+        isinstance(item, dict) and "questions" in item for item in questions
+    ):
+        for question_group in questions:
+            yield from question_group.get("questions", [])
+    else:
+        yield from questions
+
+
+def apply_image_url_map(quiz_data, url_map):
+    """
+    Point image_url and quiz_thumbnails values of quiz JSON data at the uploaded images
+
+    Values are matched on the path relative to the upload folder, ignoring the extension (for
+    example "question_images/quiz_1_question_1_1745400000.jpg"), so duplicate images all end up on
+    the one shared URL.
+
+    Args:
+        quiz_data (dict): Quiz JSON ({"quizzes": [...]}), changed in place
+        url_map (dict): {relative path: secure_url}, see load_image_url_map
+
+    Returns:
+        int: Number of values replaced
+    """
+    urls = {os.path.splitext(relative_path)[0]: url for relative_path, url in url_map.items()}
+    replaced = 0
+
+    def mapped(value):
+        nonlocal replaced
+        if not isinstance(value, str) or not value:
+            return value
+        url = urls.get(os.path.splitext(value.replace("\\", "/"))[0])
+        if url is None or url == value:
+            return value
+        replaced += 1
+        return url
+
+    for quiz in quiz_data.get("quizzes", []):
+        if "quiz_thumbnails" in quiz:
+            quiz["quiz_thumbnails"] = mapped(quiz["quiz_thumbnails"])
+        for question in _iter_questions(quiz):
+            if "image_url" in question:
+                question["image_url"] = mapped(question["image_url"])
+    return replaced
+
+
+def load_image_url_map(path=os.path.join(ROOT_FOLDER, IMAGE_URL_MAP_FILE)):
+    """Read the {relative path: secure_url} mapping written by upload_preserve_folder_structure"""
+    return load_json(path)
+
+
+def rewrite_quiz_image_urls(directory, url_map):
+    """
+    Apply url_map to every quiz JSON file under directory (backup folders are skipped)
+
+    Returns:
+        int: Number of files rewritten
+    """
+    rewritten = 0
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("backup"))
+        for file in sorted(files):
+            if not file.endswith(".json"):
+                continue
+            json_path = os.path.join(root, file)
+            try:
+                quiz_data = load_json(json_path)
+                if not isinstance(quiz_data, dict) or not apply_image_url_map(quiz_data, url_map):
+                    continue
+                with atomic_write(json_path) as f:
+                    dump_json(quiz_data, f)
+            except Exception as e:
+                print(f"❌ Failed to rewrite image URLs in {json_path}: {str(e)}")
+                continue
+            rewritten += 1
+            print(f"Rewrote image URLs in {json_path}")
+    return rewritten
+
+
+class UploadManifest:
+    """
+    Local record of what has already been uploaded, stored in the upload folder
+
+    Each image is keyed on its relative path and stores size, mtime, SHA-256, public_id, folder, the
+    preprocessing variant (None for the original file) and the returned secure_url. A file is uploaded
+    again only if its size or content or the variant changed; files whose size and mtime are unchanged
+    are not even re-hashed, so an unchanged tree costs one stat per file. Duplicates that were not
+    uploaded themselves store "duplicate_of" (the relative path of the uploaded copy) and its URL.
+    """
+
+    FILENAME = ".cloudinary_manifest.json"
+    VERSION = 1
+
+    # Save after this many recorded uploads so an interrupted run keeps its progress
+    SAVE_EVERY = 50
+
+    def __init__(self, root_folder):
+        self.path = os.path.join(root_folder, self.FILENAME)
+        self.files = {}
+        self._dirty = False
+        self._unsaved = 0
+
+        try:
+            data = load_json(self.path)
+            if data.get("version") == self.VERSION:
+                self.files = data.get("files", {})
+        except (OSError, ValueError):
+            # No manifest yet or a corrupt one: upload everything
+            pass
+
+    def lookup(self, relative_path, local_path, public_id, folder, variant=None):
+        """
+        Return the stored upload of this file if it is still current, else None
+
+        Returns:
+            dict | None: Manifest entry, or None if the file is new or changed
+        """
+        entry = self.files.get(relative_path)
+        if (not entry or entry["public_id"] != public_id or entry["folder"] != folder
+                or entry.get("variant") != variant or entry.get("duplicate_of")):
+            return None
+        try:
+            stat = os.stat(local_path)
+            if stat.st_size != entry["size"]:
+                return None
+            if stat.st_mtime_ns != entry["mtime_ns"]:
+                # Touched or copied: compare content, and remember the new mtime if it is the same
+                if sha256_file(local_path) != entry["sha256"]:
+                    return None
+                entry["mtime_ns"] = stat.st_mtime_ns
+                self._dirty = True
+        except OSError:
+            return None
+        return entry
+
+    def file_sha256(self, relative_path, local_path):
+        """SHA-256 of a local image, reusing the stored hash if size and mtime are unchanged"""
+        entry = self.files.get(relative_path)
+        stat = os.stat(local_path)
+        if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+            return entry["sha256"]
+        return sha256_file(local_path)
+
+    def record(self, relative_path, local_path, result, variant=None, sha256=None):
+        """Remember a successful upload result (see upload_file) of the source image local_path"""
+        stat = os.stat(local_path)
+        self.files[relative_path] = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": sha256 or sha256_file(local_path),
+            "public_id": result["public_id"],
+            "folder": result["folder"],
+            "variant": variant,
+            "url": result["url"],
+        }
+        self._dirty = True
+        self._unsaved += 1
+        if self._unsaved >= self.SAVE_EVERY:
+            self.save()
+
+    def record_duplicate(self, relative_path, local_path, public_id, folder, representative):
+        """Point a duplicate image at the URL of the uploaded copy (relative path representative)"""
+        uploaded = self.files.get(representative)
+        if not uploaded or uploaded.get("duplicate_of"):
+            # The copy failed to upload: forget any stale URL of the duplicate
+            if self.files.pop(relative_path, None) is not None:
+                self._dirty = True
+            return
+        stat = os.stat(local_path)
+        entry = {
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "sha256": self.file_sha256(relative_path, local_path),
+            "public_id": public_id,
+            "folder": folder,
+            "variant": uploaded.get("variant"),
+            "url": uploaded["url"],
+            "duplicate_of": representative,
+        }
+        if self.files.get(relative_path) != entry:
+            self.files[relative_path] = entry
+            self._dirty = True
+
+    def prune(self, relative_paths):
+        """Forget files that no longer exist locally (nothing is deleted on Cloudinary)"""
+        for relative_path in set(self.files) - set(relative_paths):
+            del self.files[relative_path]
+            self._dirty = True
+
+    def save(self):
+        """Write the manifest if anything changed"""
+        self._unsaved = 0
+        if not self._dirty:
+            return
+        with atomic_write(self.path) as f:
+            dump_json({"version": self.VERSION, "files": self.files}, f, "compact")
+        self._dirty = False
+
+
+class UploadJournal:
+    """
+    Append-only progress log of the current upload job, stored in the upload folder as JSON lines
+
+    Every state change of an image appends one line: "pending" when the job is planned, "in_flight"
+    when a worker starts it, "done" with the URL (and the size/mtime it was uploaded with) or "failed"
+    with the error. Done and failed lines are fsynced, so a killed run loses at most the uploads that
+    were in flight. The next run replays the journal: finished uploads are recorded in the manifest
+    without uploading again, and only pending, in-flight and failed images are uploaded. A job that
+    runs to the end compacts the journal to its failures, or removes it if there were none, so a journal
+    holding only failures is a finished job rather than an interrupted one (see interrupted).
+    """
+
+    FILENAME = ".cloudinary_journal.jsonl"
+
+    def __init__(self, root_folder):
+        self.path = os.path.join(root_folder, self.FILENAME)
+        self.entries = {}
+        self._file = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    try:
+                        event = json_loads(line)
+                    except ValueError:
+                        # Last line torn by a crash
+                        continue
+                    self.entries[event["path"]] = event
+        except OSError:
+            pass
+
+    def _append(self, events, sync):
+        """Write events as lines, flushed and optionally fsynced before returning"""
+        with self._lock:
+            if self._closed:
+                # An upload still running after the job was interrupted: it stays in flight
+                return
+            if self._file is None:
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write("".join(json_dumps(event, "compact") + "\n" for event in events))
+            self._file.flush()
+            if sync:
+                os.fsync(self._file.fileno())
+            for event in events:
+                self.entries[event["path"]] = event
+
+    def plan(self, relative_paths):
+        """Mark the images of a new job as pending"""
+        self._append([{"path": relative_path, "state": "pending"} for relative_path in relative_paths], True)
+
+    def start(self, relative_path):
+        """Mark an image as being uploaded (called from the worker thread)"""
+        self._append([{"path": relative_path, "state": "in_flight"}], False)
+
+    def done(self, relative_path, local_path, result, variant=None):
+        """Record a successful upload result (see upload_file) of the source image local_path"""
+        stat = os.stat(local_path)
+        self._append([{
+            "path": relative_path, "state": "done", "size": stat.st_size, "mtime_ns": stat.st_mtime_ns,
+            "public_id": result["public_id"], "folder": result["folder"], "variant": variant, "url": result["url"],
+        }], True)
+
+    def failed(self, relative_path, result):
+        """Record a failed upload with its error"""
+        self._append([{
+            "path": relative_path, "state": "failed", "error": result["error"], "attempts": result["attempts"],
+        }], True)
+
+    def finished(self, relative_path, local_path, public_id, folder, variant=None):
+        """
+        Return the journaled result if this exact file was already uploaded by the interrupted job, else None
+        """
+        event = self.entries.get(relative_path)
+        if (not event or event["state"] != "done" or event["public_id"] != public_id
+                or event["folder"] != folder or event["variant"] != variant):
+            return None
+        try:
+            stat = os.stat(local_path)
+        except OSError:
+            return None
+        if stat.st_size != event["size"] or stat.st_mtime_ns != event["mtime_ns"]:
+            return None
+        return event
+
+    def interrupted(self):
+        """
+        True if the previous job stopped before the end: a pending, in-flight or done image is left.
+        A job that ran to the end leaves only failed images (see compact)
+        """
+        return any(event["state"] != "failed" for event in self.entries.values())
+
+    def failures(self):
+        """{relative path: error} of the images whose last upload failed"""
+        return {path: event["error"] for path, event in self.entries.items() if event["state"] == "failed"}
+
+    def close(self):
+        """Close the journal file, keeping its content so the job can be resumed. Later events are dropped"""
+        with self._lock:
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def compact(self, relative_paths):
+        """End of job: keep only the failures of images still in relative_paths (the manifest holds the rest)"""
+        self.close()
+        self.entries = {
+            path: event for path, event in self.entries.items()
+            if event["state"] == "failed" and path in relative_paths
+        }
+        if not self.entries:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+            return
+        with atomic_write(self.path) as f:
+            f.write("".join(json_dumps(event, "compact") + "\n" for event in self.entries.values()))
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (0 for an empty list)"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+def print_upload_report(results, elapsed):
+    """Print uploads/sec and p50/p95 per-file latency"""
+    uploaded = [result for result in results if result["error"] is None]
+    latencies = [result["seconds"] for result in uploaded]
+    retried = sum(1 for result in results if result["attempts"] > 1)
+    print(
+        f"\nUploaded {len(uploaded)}/{len(results)} files in {elapsed:.2f}s "
+        f"({len(uploaded) / elapsed if elapsed else 0:.1f} uploads/sec), {retried} needed retries"
+    )
+    print(f"Per-file latency: p50={percentile(latencies, 0.50):.3f}s p95={percentile(latencies, 0.95):.3f}s")
+    failed = [result for result in results if result["error"] is not None]
+    if failed:
+        print(f"❌ {len(failed)} files failed (retried on the next run):")
+        for result in sorted(failed, key=lambda result: result["relative_path"]):
+            print(f"   {result['relative_path']}: {result['error']} ({result['attempts']} attempts)")
+
+
+def _journaled_upload(journal, relative_path, local_path, variant, *args):
+    """
+    upload_file, journaling the image as in flight before and done/failed right after (worker thread).
+    The result also gets the image's relative_path, as "path" may be a preprocessed copy in the cache
+    """
+    journal.start(relative_path)
+    result = upload_file(*args)
+    result["relative_path"] = relative_path
+    if result["error"] is None:
+        journal.done(relative_path, local_path, result, variant)
+    else:
+        journal.failed(relative_path, result)
+    return result
+
+
+def _upload_jobs(jobs, manifest, journal, upload_func, workers, retries, base_delay, variant, prepared):
+    """
+    Upload (local_path, relative_path, public_id, folder) jobs on a thread pool, recording them in
+    the journal and the manifest
+    """
+    if upload_func is None:
+        upload_func = configure_cloudinary()
+
+    gate = RateLimitGate()
+    results = []
+    start = time.perf_counter()
+    journal.plan(relative_path for _, relative_path, _, _ in jobs)
+
+    executor = ThreadPoolExecutor(max_workers=max(1, workers))
+    try:
+        futures = {}
+        for local_path, relative_path, public_id, parent_dir in jobs:
+            print(f"Processing: {relative_path}")
+            print(f"Uploading with public_id: '{public_id}', folder: '{parent_dir}'")
+            upload_path = prepared[local_path][0] if local_path in prepared else local_path
+            future = executor.submit(
+                _journaled_upload, journal, relative_path, local_path, variant,
+                upload_func, upload_path, public_id, parent_dir, retries, gate, base_delay,
+            )
+            futures[future] = (relative_path, local_path)
+
+        for future in as_completed(futures):
+            relative_path, local_path = futures[future]
+            result = future.result()
+            results.append(result)
+            if result["error"] is None:
+                print(f"✅ Uploaded: {local_path} → {result['url']}")
+                manifest.record(relative_path, local_path, result, variant)
+            else:
+                print(f"❌ Failed to upload {local_path}: {result['error']}")
+    except BaseException:
+        # Ctrl-C or an error: drop the queued uploads instead of waiting for all of them.
+        # Uploads already in flight stay "in_flight" in the journal and are redone on resume
+        executor.shutdown(wait=False, cancel_futures=True)
+        raise
+    else:
+        executor.shutdown()
+    finally:
+        manifest.save()
+        journal.close()
+
+    print_upload_report(results, time.perf_counter() - start)
+    return results
+
+
+def upload_preserve_folder_structure(root_folder=ROOT_FOLDER, workers=UPLOAD_WORKERS, upload_func=None,
+                                     retries=UPLOAD_RETRIES, base_delay=RETRY_BASE_DELAY, skip_unchanged=True,
+                                     preprocess=False, cache_folder=PREPROCESS_CACHE_FOLDER,
+                                     max_dimension=PREPROCESS_MAX_DIMENSION, quality=PREPROCESS_QUALITY,
+                                     dedupe=None, url_map_path=None):
+    """
+    Upload every image under root_folder, keeping its sub-folder as the Cloudinary folder
+
+    Up to `workers` uploads are in flight at once. Each file is retried on transient errors, and a
+    rate-limit response pauses all workers. Images already recorded in the UploadManifest with the same
+    size and content are skipped, so rerunning on an unchanged tree makes no network calls.
+    Progress is journaled as it happens (see UploadJournal): an interrupted job resumes with only the
+    images that were pending, in flight or failed, and ends with a summary of the failures.
+    With preprocess=True, images are first shrunk and re-encoded as WebP on a process pool
+    (see preprocess_image) and the smaller files are uploaded under the same public_id.
+    With dedupe, only one copy of each group of duplicate images is uploaded (see find_duplicates)
+    and the other copies share its URL.
+
+    After the run, {relative path: secure_url} for every image (duplicates included) is written to
+    url_map_path, ready for apply_image_url_map / rewrite_quiz_image_urls.
+
+    Args:
+        root_folder (str): Local folder to upload
+        workers (int): Number of concurrent uploads (1 uploads one file at a time)
+        upload_func (callable, optional): Upload function, defaults to the configured Cloudinary uploader.
+            Pass a stub to run offline
+        retries (int): Extra attempts per file
+        base_delay (float): Backoff before the first retry
+        skip_unchanged (bool): Skip files already in the manifest. False uploads everything
+            (the manifest is still updated)
+        preprocess (bool): Resize and re-encode images locally before uploading (needs Pillow)
+        cache_folder (str): Where preprocessed images are kept between runs
+        max_dimension (int): Longest side of a preprocessed image in pixels
+        quality (int): WebP quality of preprocessed images
+        dedupe (str, optional): "exact" (same bytes) or "perceptual" (also visually identical, needs Pillow)
+        url_map_path (str, optional): Where to write the URL mapping (default: image_url_map.json in root_folder)
+
+    Returns:
+        list: One result dict per uploaded file (see upload_file, plus its relative_path), in completion order
+    """
+    all_jobs = list(iter_upload_jobs(root_folder))
+    variant = preprocess_variant(max_dimension, quality) if preprocess else None
+    manifest = UploadManifest(root_folder)
+    manifest.prune(relative_path for _, relative_path, _, _ in all_jobs)
+
+    jobs = all_jobs
+    representatives = {}
+    if dedupe:
+        relative_paths = {local_path: relative_path for local_path, relative_path, _, _ in all_jobs}
+        representatives = find_duplicates(
+            list(relative_paths),
+            lambda local_path: manifest.file_sha256(relative_paths[local_path], local_path),
+            perceptual=dedupe == "perceptual",
+        )
+        jobs = [job for job in all_jobs if representatives[job[0]] == job[0]]
+        print(f"{len(all_jobs) - len(jobs)} duplicate images will share the URL of an identical image")
+
+    journal = UploadJournal(root_folder)
+    if journal.interrupted():
+        pending = []
+        for job in jobs:
+            event = journal.finished(job[1], job[0], job[2], job[3], variant)
+            if event is None:
+                pending.append(job)
+            else:
+                manifest.record(job[1], job[0], event, variant)
+        print(
+            f"Resuming interrupted upload job: {len(jobs) - len(pending)} files already uploaded, "
+            f"{len(journal.failures())} failed last time"
+        )
+        jobs = pending
+    elif journal.entries:
+        # Failed images are not in the manifest, so they are uploaded again below
+        print(f"Previous upload job finished with {len(journal.failures())} failed files, retrying them")
+
+    if skip_unchanged:
+        pending = [
+            job for job in jobs if manifest.lookup(job[1], job[0], job[2], job[3], variant) is None
+        ]
+        print(f"{len(jobs) - len(pending)} unchanged files already uploaded, {len(pending)} to upload")
+        jobs = pending
+
+    prepared = {}
+    if preprocess and jobs:
+        start = time.perf_counter()
+        prepared = preprocess_images(
+            [local_path for local_path, _, _, _ in jobs], cache_folder, max_dimension, quality
+        )
+        source_bytes = sum(source_size for _, source_size, _ in prepared.values())
+        upload_bytes = sum(upload_size for _, _, upload_size in prepared.values())
+        print(
+            f"Preprocessed {len(prepared)} images in {time.perf_counter() - start:.2f}s: "
+            f"{source_bytes / 1024 / 1024:.1f} MB → {upload_bytes / 1024 / 1024:.1f} MB to upload"
+        )
+
+    results = []
+    if jobs:
+        results = _upload_jobs(
+            jobs, manifest, journal, upload_func, workers, retries, base_delay, variant, prepared
+        )
+
+    if dedupe:
+        for local_path, relative_path, public_id, parent_dir in all_jobs:
+            representative = representatives[local_path]
+            if representative != local_path:
+                manifest.record_duplicate(
+                    relative_path, local_path, public_id, parent_dir,
+                    os.path.relpath(representative, root_folder).replace("\\", "/"),
+                )
+    manifest.save()
+    journal.compact({relative_path for _, relative_path, _, _ in all_jobs})
+
+    url_map = {
+        relative_path: manifest.files[relative_path]["url"]
+        for _, relative_path, _, _ in all_jobs if relative_path in manifest.files
+    }
+    with atomic_write(url_map_path or os.path.join(root_folder, IMAGE_URL_MAP_FILE)) as f:
+        dump_json(url_map, f)
+    return results
 
 
 if __name__ == "__main__":
-    upload_preserve_folder_structure()
+    parser = argparse.ArgumentParser(description="Upload images under upload/ to Cloudinary")
+    parser.add_argument("--root", default=ROOT_FOLDER, help="Folder to upload (default: upload)")
+    parser.add_argument("--workers", type=int, default=UPLOAD_WORKERS, help="Concurrent uploads")
+    parser.add_argument("--retries", type=int, default=UPLOAD_RETRIES, help="Extra attempts per file")
+    parser.add_argument("--force", action="store_true", help="Ignore the upload manifest and upload every file")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="Resize and re-encode images as WebP before uploading (needs Pillow)")
+    parser.add_argument("--max-dimension", type=int, default=PREPROCESS_MAX_DIMENSION,
+                        help="Longest side of preprocessed images in pixels")
+    parser.add_argument("--quality", type=int, default=PREPROCESS_QUALITY, help="WebP quality of preprocessed images")
+    parser.add_argument("--cache", default=PREPROCESS_CACHE_FOLDER, help="Folder for preprocessed images")
+    parser.add_argument("--dedupe", choices=("exact", "perceptual"),
+                        help="Upload each duplicate image once (perceptual needs Pillow)")
+    parser.add_argument("--url-map", help="Where to write {relative path: URL} (default: <root>/image_url_map.json)")
+    parser.add_argument("--rewrite-json", metavar="DIR",
+                        help="Then point image_url/quiz_thumbnails of the quiz JSON files under DIR at the URLs")
+    args = parser.parse_args()
+    upload_preserve_folder_structure(
+        args.root, args.workers, retries=args.retries, skip_unchanged=not args.force, preprocess=args.preprocess,
+        cache_folder=args.cache, max_dimension=args.max_dimension, quality=args.quality, dedupe=args.dedupe,
+        url_map_path=args.url_map,
+    )
+    if args.rewrite_json:
+        url_map = load_image_url_map(args.url_map or os.path.join(args.root, IMAGE_URL_MAP_FILE))
+        print(f"Rewrote {rewrite_quiz_image_urls(args.rewrite_json, url_map)} quiz JSON files")
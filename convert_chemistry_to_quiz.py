@@ -1,6 +1,7 @@
-import json
 import re
 
+from io_utils import dump_json
+
 
 def parse_chemistry_questions(file_path):
     """
@@ -307,9 +308,11 @@ def create_quiz_json(selected_questions, quiz_info):
     return quiz_data
 
 
-def create_single_quiz(all_questions):
+def create_single_quiz(all_questions, profile="pretty"):
     """
     Tạo một bài kiểm tra với câu hỏi do người dùng chọn
+
+    profile là kiểu định dạng file đầu ra: "pretty" (thụt lề 2) hoặc "compact"
     """
     print("\n" + "=" * 50)
     print("TẠO BÀI KIỂM TRA MỚI")
@@ -351,7 +354,7 @@ def create_single_quiz(all_questions):
     # Lưu file
     output_file = f"json/chemistry_quiz_{quiz_id}.json"
     with open(output_file, "w", encoding="utf-8") as f:
-        json.dump(quiz_json, f, ensure_ascii=False, indent=2)
+        dump_json(quiz_json, f, profile, indent=2)
 
     print(f"\n✅ Đã tạo file {output_file} với {len(selected_questions)} câu hỏi")
 
@@ -1,23 +1,26 @@
-import json
 import os
 from pathlib import Path
 
+from io_utils import atomic_write, dump_json, load_json
+
 
 def load_json_file(file_path):
     """Đọc dữ liệu từ tệp JSON."""
     try:
-        with open(file_path, "r", encoding="utf-8") as file:
-            return json.load(file)
+        return load_json(file_path)
     except Exception as e:
         print(f"Lỗi khi đọc tệp {file_path}: {e}")
         return None
 
 
-def save_json_file(data, file_path):
-    """Lưu dữ liệu vào tệp JSON."""
+def save_json_file(data, file_path, batch=None, profile="pretty"):
+    """Lưu dữ liệu vào tệp JSON (ghi tệp tạm, fsync rồi thay thế để không bao giờ để lại tệp dở dang).
+
+    profile là "pretty" (thụt lề 4, cho tệp người sửa tay) hoặc "compact" (cho tệp trung gian chỉ máy đọc).
+    """
     try:
-        with open(file_path, "w", encoding="utf-8") as file:
-            json.dump(data, file, indent=4)
+        with atomic_write(file_path, batch=batch) as file:
+            dump_json(data, file, profile, ensure_ascii=True)
         print(f"Dữ liệu đã được lưu thành công vào {file_path}")
         return True
     except Exception as e:
@@ -0,0 +1,240 @@
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from generate_sql_inserts import TABLE_COLUMNS, TABLE_ORDER, iter_row_batches, list_category_json_files
+from io_utils import load_json
+
+# Số dòng mỗi lần executemany
+LOAD_BATCH_SIZE = 1000
+
+# Ký hiệu tham số trong câu lệnh theo paramstyle của DB-API
+PLACEHOLDERS = {"qmark": "?", "format": "%s", "pyformat": "%s"}
+
+# Lược đồ SQLite tương ứng với các bảng của generate_sql_inserts, dùng để chạy thử loader trên máy
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS category (id INTEGER PRIMARY KEY, name TEXT, description TEXT, icon_url TEXT,
+    quiz_count INTEGER, total_play_count INTEGER, is_active BOOLEAN);
+CREATE TABLE IF NOT EXISTS quiz (id INTEGER PRIMARY KEY, title TEXT, description TEXT, quiz_thumbnails TEXT,
+    creator_id INTEGER, difficulty TEXT, is_public BOOLEAN, play_count INTEGER,
+    question_count INTEGER, favorite_count INTEGER);
+CREATE TABLE IF NOT EXISTS quiz_category (quiz_id INTEGER REFERENCES quiz (id),
+    category_id INTEGER REFERENCES category (id));
+CREATE TABLE IF NOT EXISTS question (id INTEGER PRIMARY KEY, quiz_id INTEGER REFERENCES quiz (id), content TEXT,
+    image_url TEXT, audio_url TEXT, time_limit INTEGER, points INTEGER, order_number INTEGER, type TEXT);
+CREATE TABLE IF NOT EXISTS question_option (id INTEGER PRIMARY KEY, question_id INTEGER REFERENCES question (id),
+    content TEXT, is_correct BOOLEAN);
+CREATE TABLE IF NOT EXISTS autocomplete_hint (id INTEGER PRIMARY KEY, content TEXT, priority INTEGER);
+"""
+
+
+class ConnectionPool:
+    """
+    Một nhóm nhỏ các kết nối database dùng chung giữa các luồng
+
+    Kết nối được tạo dần khi cần, tối đa size kết nối. Luồng mượn kết nối bằng
+    `with pool.connection() as conn:` và trả lại khi ra khỏi khối with
+    """
+
+    def __init__(self, connect, size):
+        """
+        Args:
+            connect (callable): Hàm không tham số trả về một kết nối DB-API mới
+            size (int): Số kết nối tối đa
+        """
+        self._connect = connect
+        self._idle = queue.LifoQueue()
+        self._all = []
+        self._lock = threading.Lock()
+        self.size = size
+
+    @contextmanager
+    def connection(self):
+        """Mượn một kết nối, tạo mới nếu chưa đủ size kết nối, ngược lại chờ kết nối rảnh"""
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                conn = self._connect() if len(self._all) < self.size else None
+                if conn is not None:
+                    self._all.append(conn)
+            if conn is None:
+                conn = self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        """Đóng tất cả các kết nối"""
+        with self._lock:
+            for conn in self._all:
+                conn.close()
+            self._all = []
+        self._idle = queue.LifoQueue()
+
+
+def insert_statement(table, placeholder="?"):
+    """Câu lệnh INSERT có tham số cho một dòng của bảng"""
+    columns = TABLE_COLUMNS[table]
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join([placeholder] * len(columns))})"
+
+
+def load_category_file(pool, json_path, placeholder="?", batch_size=LOAD_BATCH_SIZE):
+    """
+    Nạp một file JSON danh mục vào database trong một transaction
+
+    Args:
+        pool (ConnectionPool): Nhóm kết nối
+        json_path (str): File JSON danh mục
+        placeholder (str): Ký hiệu tham số của driver ("?" hoặc "%s")
+        batch_size (int): Số dòng mỗi lần executemany
+
+    Returns:
+        dict: {tên bảng: (số dòng, thời gian executemany tính bằng giây)}
+    """
+    json_data = load_json(json_path)
+    statements = {table: insert_statement(table, placeholder) for table in TABLE_ORDER}
+    stats = {table: [0, 0.0] for table in TABLE_ORDER}
+
+    with pool.connection() as conn:
+        cursor = conn.cursor()
+        try:
+            for table, rows in iter_row_batches(json_data, batch_size):
+                start = time.perf_counter()
+                cursor.executemany(statements[table], rows)
+                stats[table][0] += len(rows)
+                stats[table][1] += time.perf_counter() - start
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+    return {table: tuple(values) for table, values in stats.items() if values[0]}
+
+
+def load_categories(json_paths, connect, paramstyle="qmark", workers=4, batch_size=LOAD_BATCH_SIZE):
+    """
+    Nạp nhiều file JSON danh mục song song, mỗi file một transaction
+
+    Args:
+        json_paths (list): Các file JSON danh mục
+        connect (callable): Hàm tạo kết nối DB-API mới
+        paramstyle (str): paramstyle của driver (sqlite3: "qmark", pymysql: "pyformat")
+        workers (int): Số file được nạp đồng thời, cũng là số kết nối tối đa
+        batch_size (int): Số dòng mỗi lần executemany
+
+    Returns:
+        dict: {tên bảng: (tổng số dòng, tổng thời gian executemany)} của các file nạp thành công
+    """
+    placeholder = PLACEHOLDERS[paramstyle]
+    totals = {}
+    failed = []
+    pool = ConnectionPool(connect, workers)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                executor.submit(load_category_file, pool, json_path, placeholder, batch_size): json_path
+                for json_path in json_paths
+            }
+            for future in as_completed(futures):
+                json_path = futures[future]
+                try:
+                    file_stats = future.result()
+                except Exception as e:
+                    print(f"Lỗi khi nạp {json_path}: {e}")
+                    failed.append(json_path)
+                    continue
+                print(f"Đã nạp {json_path}: {sum(rows for rows, _ in file_stats.values())} dòng")
+                for table, (rows, seconds) in file_stats.items():
+                    total_rows, total_seconds = totals.get(table, (0, 0.0))
+                    totals[table] = (total_rows + rows, total_seconds + seconds)
+    finally:
+        pool.close()
+
+    if failed:
+        print(f"Có {len(failed)} file nạp lỗi (đã rollback): {', '.join(failed)}")
+    return {table: totals[table] for table in TABLE_ORDER if table in totals}
+
+
+def print_load_report(totals, elapsed):
+    """In số dòng và tốc độ nạp (dòng/giây) của từng bảng"""
+    print(f"\n{'table':>18} {'rows':>10} {'time (s)':>10} {'rows/s':>12}")
+    for table, (rows, seconds) in totals.items():
+        print(f"{table:>18} {rows:>10} {seconds:>10.3f} {rows / seconds if seconds else 0:>12.0f}")
+    total_rows = sum(rows for rows, _ in totals.values())
+    print(f"Tổng cộng {total_rows} dòng trong {elapsed:.2f} giây ({total_rows / elapsed if elapsed else 0:.0f} dòng/giây)")
+
+
+def sqlite_connector(database_path, create_schema=True):
+    """Hàm tạo kết nối SQLite cho ConnectionPool (bật khóa ngoại, dùng được từ nhiều luồng)"""
+    if create_schema:
+        with sqlite3.connect(database_path) as conn:
+            conn.executescript(SQLITE_SCHEMA)
+        conn.close()
+
+    def connect():
+        conn = sqlite3.connect(database_path, timeout=60, check_same_thread=False)
+        conn.execute("PRAGMA foreign_keys = ON")
+        return conn
+
+    return connect
+
+
+def mysql_connector(host, port, user, password, database):
+    """Hàm tạo kết nối MySQL cho ConnectionPool (cần cài pymysql)"""
+    import pymysql
+
+    def connect():
+        return pymysql.connect(
+            host=host, port=port, user=user, password=password, database=database, charset="utf8mb4"
+        )
+
+    return connect
+
+
+def main():
+    """Nạp tất cả các file trong data/json/category trực tiếp vào database"""
+    parser = argparse.ArgumentParser(description="Nạp dữ liệu quiz từ data/json/category vào database")
+    parser.add_argument("--sqlite", default=os.path.join("data", "quiz.db"),
+                        help="File SQLite để nạp thử (mặc định: data/quiz.db)")
+    parser.add_argument("--mysql-host", help="Nạp vào MySQL thay vì SQLite (cần pymysql)")
+    parser.add_argument("--mysql-port", type=int, default=3306)
+    parser.add_argument("--mysql-user", default="root")
+    parser.add_argument("--mysql-password", default="")
+    parser.add_argument("--mysql-database", default="quiz")
+    parser.add_argument("--workers", type=int, default=4, help="Số file nạp đồng thời")
+    parser.add_argument("--batch-size", type=int, default=LOAD_BATCH_SIZE, help="Số dòng mỗi lần executemany")
+    args = parser.parse_args()
+
+    json_paths = sorted(list_category_json_files(os.path.join("data", "json", "category")))
+
+    if args.mysql_host:
+        try:
+            connect = mysql_connector(
+                args.mysql_host, args.mysql_port, args.mysql_user, args.mysql_password, args.mysql_database
+            )
+        except ImportError:
+            print("Lỗi: cần cài pymysql để nạp vào MySQL (pip install pymysql)")
+            return
+        paramstyle = "pyformat"
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(args.sqlite)), exist_ok=True)
+        connect = sqlite_connector(args.sqlite)
+        paramstyle = sqlite3.paramstyle
+
+    start = time.perf_counter()
+    totals = load_categories(json_paths, connect, paramstyle, args.workers, args.batch_size)
+    print_load_report(totals, time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,58 +1,132 @@
-import json
+import argparse
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
 
+from io_utils import (
+    COMPRESSION_SUFFIXES, append_file, atomic_write, compressed_path, compression_for_path, dump_json,
+    file_signature, load_json, sha256_file,
+)
 
-def load_json(file_path):
-    """Tải dữ liệu JSON từ file."""
-    with open(file_path, "r", encoding="utf-8") as file:
-        return json.load(file)
 
+# Cột của từng bảng theo đúng thứ tự trong câu lệnh INSERT
+TABLE_COLUMNS = {
+    "category": ("id", "name", "description", "icon_url", "quiz_count", "total_play_count", "is_active"),
+    "quiz": (
+        "id", "title", "description", "quiz_thumbnails", "creator_id", "difficulty",
+        "is_public", "play_count", "question_count", "favorite_count",
+    ),
+    "quiz_category": ("quiz_id", "category_id"),
+    "question": (
+        "id", "quiz_id", "content", "image_url", "audio_url", "time_limit", "points", "order_number", "type",
+    ),
+    "question_option": ("id", "question_id", "content", "is_correct"),
+    "autocomplete_hint": ("id", "content", "priority"),
+}
 
-def generate_inserts(json_data):
-    """Tạo các câu lệnh SQL INSERT từ dữ liệu JSON."""
-    sql_statements = []
+# Cột khóa của từng bảng, dùng để so sánh với snapshot ở chế độ delta
+TABLE_KEYS = {table: ("id",) for table in TABLE_COLUMNS}
+TABLE_KEYS["quiz_category"] = ("quiz_id", "category_id")
+
+# Thứ tự ghi các bảng khi gộp nhiều dòng: bảng cha luôn đứng trước bảng con để không vi phạm khóa ngoại
+TABLE_ORDER = ("category", "quiz", "quiz_category", "question", "question_option", "autocomplete_hint")
+
+# Số dòng tối đa trong một câu lệnh INSERT nhiều dòng khi chạy main()
+SQL_BATCH_SIZE = 500
+
+
+def sql_string(value):
+    """
+    Chuỗi SQL trong dấu nháy đơn: nhân đôi dấu nháy đơn và escape dấu gạch chéo ngược
+    (MySQL mặc định coi \\ là ký tự escape, để nguyên thì \\' sẽ làm hỏng câu lệnh)
+    """
+    # Phần lớn chuỗi không chứa ký tự cần escape, kiểm tra trước rẻ hơn gọi replace
+    if "'" in value or "\\" in value:
+        value = value.replace("\\", "\\\\").replace("'", "''")
+    return "'" + value + "'"
+
+
+# Cách viết literal SQL theo đúng kiểu giá trị, tra một lần thay cho chuỗi isinstance
+_SQL_LITERALS = {
+    str: sql_string,
+    int: str,
+    bool: lambda value: "true" if value else "false",
+    type(None): lambda value: "NULL",
+    float: str,
+}
+
+
+def sql_literal(value):
+    """Giá trị Python ở dạng literal SQL: None thành NULL, bool thành true/false, chuỗi trong dấu nháy đơn"""
+    render = _SQL_LITERALS.get(type(value))
+    if render is not None:
+        return render(value)
+    # Lớp con của str/bool/int hiếm gặp
+    if isinstance(value, str):
+        return sql_string(value)
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    return str(value)
 
-    # Thêm transaction start
-    sql_statements.append("START TRANSACTION;")
 
-    # Thêm câu lệnh INSERT cho bảng category
+def _update_columns(table):
+    """Các cột được gán lại khi trùng khóa ở chế độ upsert"""
+    # Bảng chỉ gồm cột khóa (quiz_category) không có gì để cập nhật, gán lại khóa để bỏ qua dòng trùng
+    return [column for column in TABLE_COLUMNS[table] if column not in TABLE_KEYS[table]] or list(TABLE_KEYS[table])
+
+
+# Phần cố định của câu lệnh INSERT cho từng bảng, dựng sẵn một lần
+INSERT_TEMPLATES = {
+    table: f"\nINSERT INTO {table} ({', '.join(columns)})\nVALUES " for table, columns in TABLE_COLUMNS.items()
+}
+UPSERT_CLAUSES = {
+    table: "\nON DUPLICATE KEY UPDATE " + ", ".join(
+        f"{column} = VALUES({column})" for column in _update_columns(table)
+    )
+    for table in TABLE_COLUMNS
+}
+
+
+def format_row(row):
+    """Một dòng giá trị ở dạng (v1, v2, ...) trong mệnh đề VALUES"""
+    return "(" + ", ".join(map(sql_literal, row)) + ")"
+
+
+def iter_rows(json_data):
+    """
+    Duyệt dữ liệu JSON và sinh từng dòng cần chèn theo thứ tự xuất hiện
+
+    Yields:
+        tuple: (tên bảng, tuple các giá trị theo TABLE_COLUMNS, None là NULL)
+    """
     for category in json_data.get("categories", []):
-        category_insert = f"""
-INSERT INTO category (id, name, description, icon_url, quiz_count, total_play_count, is_active)
-VALUES ({category['id']}, 
-        '{category['name'].replace("'", "''")}', 
-        '{category['description'].replace("'", "''")}', 
-        '{category['icon_url']}', 
-        {category['quiz_count']},
-        {category['total_play_count']},
-        {str(category['is_active']).lower()});
-"""
-        sql_statements.append(category_insert)
+        yield "category", (
+            category["id"],
+            category["name"],
+            category["description"],
+            category["icon_url"],
+            category["quiz_count"],
+            category["total_play_count"],
+            category["is_active"],
+        )
 
     # Lặp qua từng quiz trong dữ liệu JSON
     for quiz in json_data.get("quizzes", []):
-        # Insert quiz
-        quiz_insert = f"""
-INSERT INTO quiz (id, title, description, quiz_thumbnails, creator_id, difficulty, is_public, play_count, question_count, favorite_count)
-VALUES ({quiz['id']}, 
-        '{quiz['title'].replace("'", "''")}', 
-        '{quiz['description'].replace("'", "''")}', 
-        '{quiz['quiz_thumbnails']}', 
-        {quiz['creator_id']}, 
-        '{quiz['difficulty']}', 
-        {str(quiz['is_public']).lower()}, 
-        {quiz['play_count']}, 
-        {quiz['question_count']},
-        {quiz['favorite_count']});
-"""
-        sql_statements.append(quiz_insert)
-
-        # Insert quan hệ quiz_category
-        quiz_category_insert = f"""
-INSERT INTO quiz_category (quiz_id, category_id)
-VALUES ({quiz['id']}, {quiz['category_id']});
-"""
-        sql_statements.append(quiz_category_insert)
+        yield "quiz", (
+            quiz["id"],
+            quiz["title"],
+            quiz["description"],
+            quiz["quiz_thumbnails"],
+            quiz["creator_id"],
+            quiz["difficulty"],
+            quiz["is_public"],
+            quiz["play_count"],
+            quiz["question_count"],
+            quiz["favorite_count"],
+        )
+
+        # Quan hệ quiz_category
+        yield "quiz_category", (quiz["id"], quiz["category_id"])
 
         # Xử lý các câu hỏi (questions)
         if "questions" in quiz:
@@ -65,122 +139,723 @@ VALUES ({quiz['id']}, {quiz['category_id']});
                 # Cấu trúc nhóm câu hỏi
                 for question_group in quiz["questions"]:
                     for question in question_group.get("questions", []):
-                        process_question(question, sql_statements)
+                        yield from process_question(question)
             else:
                 # Cấu trúc mảng đơn giản
                 for question in quiz["questions"]:
-                    process_question(question, sql_statements)
+                    yield from process_question(question)
 
     # Xử lý autocomplete_hints nếu có
     for hint in json_data.get("autocomplete_hints", []):
-        hint_insert = f"""
-INSERT INTO autocomplete_hint (id, content, priority)
-VALUES ({hint['id']}, 
-        '{hint['content'].replace("'", "''")}', 
-        {hint['priority']});
-"""
-        sql_statements.append(hint_insert)
+        yield "autocomplete_hint", (hint["id"], hint["content"], hint["priority"])
 
-    # Thêm transaction commit
-    sql_statements.append("COMMIT;")
-
-    return "\n".join(sql_statements)
-
-
-def process_question(question, sql_statements):
-    """Xử lý từng câu hỏi và tùy chọn của nó."""
-    # Xử lý giá trị NULL cho image_url và audio_url
-    image_url = f"'{question['image_url']}'" if question.get("image_url") else "NULL"
-    audio_url = f"'{question['audio_url']}'" if question.get("audio_url") else "NULL"
-
-    question_insert = f"""
-INSERT INTO question (id, quiz_id, content, image_url, audio_url, time_limit, points, order_number, type)
-VALUES ({question['id']}, 
-        {question['quiz_id']}, 
-        '{question['content'].replace("'", "''")}', 
-        {image_url}, 
-        {audio_url}, 
-        {question['time_limit']}, 
-        {question['points']}, 
-        {question['order_number']}, 
-        '{question['type']}');
-"""
-    sql_statements.append(question_insert)
+
+def process_question(question):
+    """Sinh dòng của một câu hỏi và các tùy chọn của nó."""
+    yield "question", (
+        question["id"],
+        question["quiz_id"],
+        question["content"],
+        # image_url và audio_url rỗng được lưu là NULL
+        question.get("image_url") or None,
+        question.get("audio_url") or None,
+        question["time_limit"],
+        question["points"],
+        question["order_number"],
+        question["type"],
+    )
 
     # Xử lý các tùy chọn câu trả lời
     for option in question.get("options", []):
-        # Xử lý giá trị NULL cho content
-        option_content = (
-            f"'{option['content'].replace('\'', '\'\'')}'"
-            if option.get("content")
-            else "NULL"
+        yield "question_option", (
+            option["id"],
+            option["question_id"],
+            # Nội dung rỗng được lưu là NULL
+            option.get("content") or None,
+            option["is_correct"],
+        )
+
+
+def format_insert(table, rows, upsert=False):
+    """
+    Tạo một câu lệnh INSERT cho một hoặc nhiều dòng của cùng một bảng.
+
+    Nếu upsert=True, thêm ON DUPLICATE KEY UPDATE để dòng đã có (cùng khóa) được cập nhật thay vì báo lỗi.
+    """
+    values = ",\n       ".join(map(format_row, rows))
+    return INSERT_TEMPLATES[table] + values + (UPSERT_CLAUSES[table] if upsert else "") + ";\n"
+
+
+def iter_row_batches(json_data, batch_size=None):
+    """
+    Gom các dòng của iter_rows thành từng lô theo bảng
+
+    Khi một bảng đủ batch_size dòng, tất cả các bảng đang chờ được trả ra theo TABLE_ORDER,
+    nên dòng cha luôn đến trước dòng con tham chiếu tới nó
+
+    Args:
+        json_data (dict): Dữ liệu JSON của một danh mục
+        batch_size (int, optional): Số dòng tối đa mỗi lô. Mặc định mỗi dòng là một lô riêng
+
+    Yields:
+        tuple: (tên bảng, danh sách các dòng)
+    """
+    if not batch_size:
+        for table, row in iter_rows(json_data):
+            yield table, [row]
+        return
+
+    pending = {table: [] for table in TABLE_ORDER}
+    for table, row in iter_rows(json_data):
+        pending[table].append(row)
+        if len(pending[table]) >= batch_size:
+            yield from _flush_pending(pending)
+    yield from _flush_pending(pending)
+
+
+def _flush_pending(pending):
+    """Trả ra các dòng đang chờ của từng bảng theo TABLE_ORDER rồi xóa chúng"""
+    for table in TABLE_ORDER:
+        if pending[table]:
+            yield table, pending[table]
+            pending[table] = []
+
+
+def generate_inserts(json_data, batch_size=None):
+    """
+    Sinh lần lượt các câu lệnh SQL INSERT từ dữ liệu JSON.
+
+    Args:
+        json_data (dict): Dữ liệu JSON của một danh mục
+        batch_size (int, optional): Nếu có, gộp tối đa batch_size dòng của cùng một bảng vào một câu lệnh
+            INSERT nhiều dòng. Mặc định mỗi dòng là một câu lệnh riêng
+
+    Yields:
+        str: Từng câu lệnh, mở đầu bằng START TRANSACTION và kết thúc bằng COMMIT
+    """
+    # Thêm transaction start
+    yield "START TRANSACTION;"
+
+    for table, rows in iter_row_batches(json_data, batch_size):
+        yield format_insert(table, rows)
+
+    # Thêm transaction commit
+    yield "COMMIT;"
+
+
+# Kích thước bộ đệm ghi file SQL
+SQL_WRITE_BUFFER_SIZE = 1024 * 1024
+
+
+def save_sql(statements, output_path):
+    """
+    Lưu các câu lệnh SQL vào file, ghi dần từng câu lệnh ngay khi được sinh ra.
+
+    File được ghi qua file tạm rồi mới thay thế, và được nén gzip/zstd nếu output_path có đuôi .gz/.zst
+
+    Args:
+        statements (iterable | str): Các câu lệnh (ví dụ kết quả của generate_inserts) hoặc cả nội dung SQL
+        output_path (str): File đầu ra
+    """
+    with atomic_write(output_path, buffering=SQL_WRITE_BUFFER_SIZE) as file:
+        if isinstance(statements, str):
+            file.write(statements)
+            return
+
+        # Các câu lệnh cách nhau một dòng trống, giống "\n".join(...)
+        separator = ""
+        for statement in statements:
+            file.write(separator)
+            file.write(statement)
+            separator = "\n"
+
+
+# Ký tự cần escape trong file TSV theo định dạng mặc định của LOAD DATA (và COPY dạng text)
+_TSV_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+# Tên script nạp dữ liệu được tạo cùng các file TSV
+LOAD_SCRIPT_NAME = "load_data.sql"
+
+
+def tsv_field(value):
+    """Giá trị Python ở dạng một trường TSV: None thành \\N, bool thành 1/0, escape tab và xuống dòng"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def generate_load_script(table_files):
+    """
+    Sinh script LOAD DATA nạp các file TSV theo TABLE_ORDER
+
+    Args:
+        table_files (dict): {tên bảng: tên file TSV}, đường dẫn tính từ thư mục chạy script
+    """
+    yield "-- Chạy script này từ thư mục chứa các file TSV, ví dụ: mysql --local-infile=1 ... < load_data.sql"
+    yield "SET NAMES utf8mb4;"
+    for table in TABLE_ORDER:
+        if table not in table_files:
+            continue
+        yield (
+            f"\nLOAD DATA LOCAL INFILE '{table_files[table]}'\n"
+            f"INTO TABLE {table}\n"
+            "CHARACTER SET utf8mb4\n"
+            "FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\'\n"
+            "LINES TERMINATED BY '\\n'\n"
+            f"({', '.join(TABLE_COLUMNS[table])});"
         )
-        option_insert = f"""
-INSERT INTO question_option (id, question_id, content, is_correct)
-VALUES ({option['id']}, 
-        {option['question_id']}, 
-        {option_content}, 
-        {str(option['is_correct']).lower()});
-"""
-        sql_statements.append(option_insert)
 
 
-def save_sql(sql_content, output_path):
-    """Lưu nội dung SQL vào file."""
-    with open(output_path, "w", encoding="utf-8") as file:
-        file.write(sql_content)
+def export_tsv(json_paths, output_directory):
+    """
+    Xuất dữ liệu của các file JSON thành một file TSV cho mỗi bảng cùng script nạp LOAD DATA
+
+    Args:
+        json_paths (list): Các file JSON danh mục, dữ liệu được ghi nối tiếp theo thứ tự này
+        output_directory (str): Thư mục chứa các file <bảng>.tsv và load_data.sql
+
+    Returns:
+        dict: Số dòng đã ghi của mỗi bảng
+    """
+    os.makedirs(output_directory, exist_ok=True)
+    table_files = {table: f"{table}.tsv" for table in TABLE_ORDER}
+    row_counts = dict.fromkeys(TABLE_ORDER, 0)
+
+    # newline="" để luôn ghi "\n", kể cả trên Windows
+    files = {
+        table: open(
+            os.path.join(output_directory, file_name), "w", encoding="utf-8", newline="",
+            buffering=SQL_WRITE_BUFFER_SIZE,
+        )
+        for table, file_name in table_files.items()
+    }
+    try:
+        for json_path in json_paths:
+            print(f"Đang xuất {json_path}...")
+            for table, row in iter_rows(load_json(json_path)):
+                files[table].write("\t".join(map(tsv_field, row)) + "\n")
+                row_counts[table] += 1
+    finally:
+        for file in files.values():
+            file.close()
+
+    save_sql(generate_load_script(table_files), os.path.join(output_directory, LOAD_SCRIPT_NAME))
+    return row_counts
+
+
+# Thư mục con của data/sql chứa snapshot lần xuất gần nhất và các file delta
+SNAPSHOT_DIRECTORY = "snapshots"
+DELTA_DIRECTORY = "delta"
+
+# Tăng khi đổi định dạng snapshot. Snapshot lưu giá trị gốc của các dòng nên không phụ thuộc
+# SQL_GENERATOR_VERSION: đổi cách sinh SQL không làm mất mốc so sánh của chế độ delta
+SNAPSHOT_VERSION = 1
+
+
+def snapshot_rows(json_data):
+    """
+    Các dòng của dữ liệu JSON, đánh chỉ mục theo bảng và khóa
+
+    Returns:
+        dict: {tên bảng: {khóa dạng chuỗi: danh sách giá trị theo TABLE_COLUMNS}}
+    """
+    tables = {table: {} for table in TABLE_ORDER}
+    key_indexes = {
+        table: [TABLE_COLUMNS[table].index(column) for column in TABLE_KEYS[table]] for table in TABLE_ORDER
+    }
+    for table, row in iter_rows(json_data):
+        key = ",".join(str(row[i]) for i in key_indexes[table])
+        tables[table][key] = list(row)
+    return tables
+
+
+def snapshot_path(json_path, output_directory):
+    """Đường dẫn snapshot của một file JSON danh mục"""
+    return os.path.join(output_directory, SNAPSHOT_DIRECTORY, os.path.basename(json_path))
+
+
+def save_snapshot(tables, path):
+    """Lưu snapshot (kết quả của snapshot_rows) của lần xuất vừa rồi"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with atomic_write(path) as f:
+        dump_json({"version": SNAPSHOT_VERSION, "tables": tables}, f, "compact")
+
+
+def load_snapshot(path):
+    """Đọc snapshot lần xuất trước, trả về None nếu chưa có hoặc không dùng được"""
+    try:
+        data = load_json(path)
+    except (OSError, ValueError):
+        return None
+    if data.get("version") != SNAPSHOT_VERSION:
+        return None
+    return data.get("tables")
+
+
+def format_delete(table, rows):
+    """Tạo câu lệnh DELETE các dòng (theo khóa) của cùng một bảng."""
+    keys = TABLE_KEYS[table]
+    key_indexes = [TABLE_COLUMNS[table].index(column) for column in keys]
+    if len(keys) == 1:
+        values = ", ".join(sql_literal(row[key_indexes[0]]) for row in rows)
+        return f"\nDELETE FROM {table} WHERE {keys[0]} IN ({values});\n"
+    values = ", ".join(f"({', '.join(sql_literal(row[i]) for i in key_indexes)})" for row in rows)
+    return f"\nDELETE FROM {table} WHERE ({', '.join(keys)}) IN ({values});\n"
+
+
+def current_keys(json_paths):
+    """
+    Khóa của tất cả các dòng trong các file JSON danh mục hiện tại
+
+    Returns:
+        dict: {tên bảng: tập khóa dạng chuỗi như trong snapshot_rows}
+    """
+    keys = {table: set() for table in TABLE_ORDER}
+    for json_path in json_paths:
+        for table, rows in snapshot_rows(load_json(json_path)).items():
+            keys[table].update(rows)
+    return keys
+
+
+def generate_delta(current, previous, batch_size=SQL_BATCH_SIZE, keep=None):
+    """
+    Sinh các câu lệnh đưa database từ snapshot previous lên dữ liệu current
+
+    Dòng mới hoặc có giá trị thay đổi được ghi bằng INSERT ... ON DUPLICATE KEY UPDATE theo TABLE_ORDER
+    (bảng cha trước), dòng không còn trong dữ liệu bị DELETE theo thứ tự ngược lại (bảng con trước).
+    Nếu không có gì thay đổi thì không sinh câu lệnh nào
+
+    Args:
+        current (dict): snapshot_rows của dữ liệu hiện tại
+        previous (dict): snapshot_rows của lần xuất trước (None: coi như database trống)
+        batch_size (int): Số dòng tối đa mỗi câu lệnh
+        keep (dict, optional): {tên bảng: tập khóa} không được DELETE vì vẫn còn ở file danh mục khác
+            (dòng chuyển sang danh mục khác được delta của danh mục mới UPSERT)
+
+    Yields:
+        str: Từng câu lệnh, bọc trong START TRANSACTION/COMMIT
+    """
+    previous = previous or {}
+    upserts = {}
+    deletes = {}
+    for table in TABLE_ORDER:
+        current_rows = current.get(table, {})
+        previous_rows = previous.get(table, {})
+        upserts[table] = [
+            row for key, row in current_rows.items() if previous_rows.get(key) != row
+        ]
+        kept = keep.get(table, ()) if keep else ()
+        deletes[table] = [
+            row for key, row in previous_rows.items() if key not in current_rows and key not in kept
+        ]
+
+    if not any(upserts.values()) and not any(deletes.values()):
+        return
+
+    # UPSERT trước DELETE: dòng con chuyển sang dòng cha mới phải được cập nhật trước khi xóa dòng cha cũ
+    yield "START TRANSACTION;"
+    for table in TABLE_ORDER:
+        rows = upserts[table]
+        for i in range(0, len(rows), batch_size):
+            yield format_insert(table, rows[i:i + batch_size], upsert=True)
+    for table in reversed(TABLE_ORDER):
+        rows = deletes[table]
+        for i in range(0, len(rows), batch_size):
+            yield format_delete(table, rows[i:i + batch_size])
+    yield "COMMIT;"
+
+
+def write_category_delta(json_path, output_directory, batch_size=SQL_BATCH_SIZE, compression=None, keep=None):
+    """
+    So sánh một file JSON danh mục với snapshot lần xuất trước và ghi file delta nếu có thay đổi
+
+    Snapshot được cập nhật sau khi ghi delta, nên lần chạy sau chỉ chứa các thay đổi mới.
+    Nếu file JSON đã bị xóa, delta xóa toàn bộ các dòng trong snapshot và snapshot bị xóa theo.
+    Truyền keep=current_keys(tất cả file danh mục) để dòng chuyển sang danh mục khác không bị xóa,
+    khi đó các file delta áp dụng theo thứ tự nào cũng được
+
+    Returns:
+        str: Đường dẫn file delta, hoặc None nếu không có gì thay đổi
+    """
+    path = snapshot_path(json_path, output_directory)
+    removed = not os.path.exists(json_path) or os.path.getsize(json_path) == 0
+    current = {} if removed else snapshot_rows(load_json(json_path))
+    statements = list(generate_delta(current, load_snapshot(path), batch_size, keep))
+    if not statements:
+        return None
+
+    delta_directory = os.path.join(output_directory, DELTA_DIRECTORY)
+    os.makedirs(delta_directory, exist_ok=True)
+    delta_path = compressed_path(
+        os.path.join(delta_directory, f"{os.path.splitext(os.path.basename(json_path))[0]}_delta.sql"), compression
+    )
+    save_sql(statements, delta_path)
+    if removed:
+        os.remove(path)
+    else:
+        save_snapshot(current, path)
+    return delta_path
+
+
+def _source_entry(file_path, previous_entry=None):
+    """
+    [tên file, kích thước, mtime, sha256] của một file nguồn. Nếu kích thước và mtime giống lần trước
+    thì dùng lại mã băm cũ, không đọc lại file
+    """
+    entry = [os.path.basename(file_path)] + file_signature(file_path)
+    if previous_entry and previous_entry[:3] == entry:
+        return previous_entry
+    return entry + [sha256_file(file_path)]
 
 
 def merge_sql_files(input_directory, output_file):
-    """Merge multiple SQL files into a single SQL file."""
+    """
+    Merge multiple SQL files into a single SQL file.
+
+    Các file được nối theo thứ tự tên file, sao chép nguyên byte bằng kernel (os.sendfile) nên bộ nhớ
+    không phụ thuộc kích thước file. Nếu output_file có đuôi .gz/.zst thì chỉ các file *.sql.gz/*.sql.zst
+    cùng kiểu nén được gộp: nhiều member gzip (hoặc frame zstd) nối liền vẫn là một file nén hợp lệ,
+    nên không cần giải nén rồi nén lại. Tên, kích thước, mtime và mã băm của các file nguồn được lưu cạnh
+    file gộp; nếu lần sau nội dung các file nguồn vẫn như cũ (kể cả khi chúng vừa được tạo lại với
+    cùng nội dung) và file gộp không bị sửa thì file gộp không được ghi lại
+
+    Returns:
+        bool: True nếu file gộp được ghi lại, False nếu bỏ qua vì không có gì thay đổi
+    """
     # Get the absolute path of the output file
     output_path = os.path.abspath(output_file)
+    signature_path = os.path.join(
+        os.path.dirname(output_path), f".{os.path.basename(output_path)}.sources.json"
+    )
+
+    suffix = compressed_path(".sql", compression_for_path(output_file))
+
+    # Theo thứ tự tên file để file gộp giống hệt nhau giữa các lần chạy
+    input_paths = [
+        os.path.join(input_directory, filename)
+        for filename in sorted(os.listdir(input_directory))
+        # Skip the output file if it's in the same directory
+        if filename.endswith(suffix) and os.path.abspath(os.path.join(input_directory, filename)) != output_path
+    ]
+
+    try:
+        previous = load_json(signature_path)
+        previous_sources = {entry[0]: entry for entry in previous["sources"]}
+        previous_output = previous["output"]
+    except (OSError, ValueError, KeyError, TypeError, IndexError):
+        # Chưa gộp lần nào hoặc thông tin lần trước bị hỏng
+        previous = None
+        previous_sources = {}
+        previous_output = None
 
-    with open(output_file, "w", encoding="utf-8") as outfile:
-        for filename in os.listdir(input_directory):
-            if filename.endswith(".sql"):
-                file_path = os.path.join(input_directory, filename)
-                # Skip the output file if it's in the same directory
-                if os.path.abspath(file_path) == output_path:
-                    continue
+    sources = [
+        _source_entry(path, previous_sources.get(os.path.basename(path))) for path in input_paths
+    ]
 
-                with open(file_path, "r", encoding="utf-8") as infile:
-                    outfile.write(infile.read())
-                    # outfile.write("\n")  # Add a newline between files
+    unchanged = (
+        previous is not None
+        and [(entry[0], entry[3]) for entry in sources]
+        == [(entry[0], entry[3]) for entry in previous["sources"]]
+        and os.path.exists(output_file)
+        and file_signature(output_file) == previous_output
+    )
+    if not unchanged:
+        with atomic_write(output_file, "wb", compress=False) as outfile:
+            for file_path in input_paths:
+                append_file(file_path, outfile)
+
+    if not unchanged or sources != previous["sources"]:
+        with atomic_write(signature_path) as f:
+            dump_json({"sources": sources, "output": file_signature(output_file)}, f, "compact")
+    return not unchanged
+
+
+def list_category_json_files(json_directory):
+    """Các file JSON khác rỗng trong thư mục danh mục, theo thứ tự tên file"""
+    return [
+        os.path.join(json_directory, filename)
+        for filename in sorted(os.listdir(json_directory))
+        # Kiểm tra file json và khác rỗng
+        if filename.endswith(".json") and os.path.getsize(os.path.join(json_directory, filename)) > 0
+    ]
 
 
-def main():
-    """Hàm chính để xử lý việc tạo các câu lệnh SQL từ các file JSON."""
+# Tăng mỗi khi thay đổi cách sinh SQL để các file *_inserts.sql cũ được tạo lại
+# (2: sql_string escape dấu gạch chéo ngược)
+SQL_GENERATOR_VERSION = 2
+
+
+class SqlManifest:
+    """
+    Manifest lưu trong data/sql ghi lại từng file JSON danh mục đã được chuyển thành SQL
+
+    Mỗi file nguồn có kích thước, mtime, mã băm SHA-256, phiên bản bộ sinh SQL và thông tin file SQL
+    đầu ra. File nguồn chỉ được chuyển lại khi nội dung, phiên bản bộ sinh hoặc batch_size thay đổi,
+    hoặc file SQL đầu ra bị xóa/sửa. File không đổi mtime và kích thước thì không cần đọc lại
+    """
+
+    FILENAME = ".sql_manifest.json"
+    VERSION = 1
+
+    def __init__(self, output_directory, batch_size=SQL_BATCH_SIZE):
+        self.path = os.path.join(output_directory, self.FILENAME)
+        self.generator = {"version": SQL_GENERATOR_VERSION, "batch_size": batch_size}
+        self.sources = {}
+        self._dirty = False
+
+        try:
+            data = load_json(self.path)
+            if data.get("version") == self.VERSION:
+                self.sources = data.get("sources", {})
+        except (OSError, ValueError):
+            # Chưa có manifest hoặc manifest hỏng: chuyển lại tất cả
+            pass
+
+    def is_up_to_date(self, json_path, output_path):
+        """Kiểm tra file SQL của json_path còn đúng với nội dung file JSON hiện tại hay không"""
+        entry = self.sources.get(json_path)
+        if not entry or entry["generator"] != self.generator or entry["output"] != output_path:
+            return False
+        try:
+            if file_signature(output_path) != entry["output_signature"]:
+                return False
+            if file_signature(json_path) == [entry["size"], entry["mtime_ns"]]:
+                return True
+            # mtime thay đổi (ví dụ file được lưu lại hoặc sao chép): so sánh nội dung
+            if sha256_file(json_path) != entry["sha256"]:
+                return False
+        except OSError:
+            return False
+
+        self.record(json_path, output_path, entry["sha256"])
+        return True
+
+    def record(self, json_path, output_path, sha256=None):
+        """Ghi nhận json_path vừa được chuyển thành output_path"""
+        previous = self.sources.get(json_path)
+        if previous and previous["output"] != output_path:
+            # Đổi kiểu nén: xóa file SQL cũ để nó không bị gộp cùng file mới
+            try:
+                os.remove(previous["output"])
+            except OSError:
+                pass
+        size, mtime_ns = file_signature(json_path)
+        self.sources[json_path] = {
+            "size": size,
+            "mtime_ns": mtime_ns,
+            "sha256": sha256 or sha256_file(json_path),
+            "generator": self.generator,
+            "output": output_path,
+            "output_signature": file_signature(output_path),
+        }
+        self._dirty = True
+
+    def prune(self, json_paths):
+        """
+        Bỏ các file nguồn không còn tồn tại khỏi manifest và xóa file SQL do chúng tạo ra
+
+        Returns:
+            list: Các file SQL đã xóa
+        """
+        removed = []
+        for json_path in set(self.sources) - set(json_paths):
+            output_path = self.sources.pop(json_path)["output"]
+            self._dirty = True
+            try:
+                os.remove(output_path)
+                removed.append(output_path)
+            except OSError:
+                pass
+        return removed
+
+    def save(self):
+        """Lưu manifest nếu có thay đổi"""
+        if not self._dirty:
+            return
+        with atomic_write(self.path) as f:
+            dump_json({"version": self.VERSION, "sources": self.sources}, f, "compact")
+        self._dirty = False
+
+
+def category_output_path(json_path, output_directory, compression=None):
+    """Đường dẫn file <tên>_inserts.sql (thêm .gz/.zst nếu nén) tương ứng với một file JSON danh mục"""
+    filename = os.path.basename(json_path)
+    return compressed_path(
+        os.path.join(output_directory, f"{os.path.splitext(filename)[0]}_inserts.sql"), compression
+    )
+
+
+def convert_category_file(json_path, output_directory, batch_size=SQL_BATCH_SIZE, compression=None):
+    """
+    Tạo file <tên>_inserts.sql và snapshot cho một file JSON danh mục (chạy được trong tiến trình con)
+
+    Returns:
+        str: Đường dẫn file SQL đã lưu
+    """
+    output_path = category_output_path(json_path, output_directory, compression)
+    json_data = load_json(json_path)
+    save_sql(generate_inserts(json_data, batch_size=batch_size), output_path)
+    # Lần xuất đầy đủ cũng là mốc để so sánh cho chế độ delta
+    save_snapshot(snapshot_rows(json_data), snapshot_path(json_path, output_directory))
+    return output_path
+
+
+def convert_category_files(json_paths, output_directory, workers=1, compression=None, batch_size=SQL_BATCH_SIZE):
+    """
+    Tạo file SQL cho từng file JSON danh mục, song song trên workers tiến trình nếu workers > 1
+
+    Các file độc lập với nhau nên thứ tự hoàn thành không ảnh hưởng kết quả; file gộp được tạo
+    sau đó theo thứ tự tên file
+
+    Returns:
+        list: Đường dẫn các file SQL đã lưu thành công, theo thứ tự của json_paths
+    """
+    if workers <= 1 or len(json_paths) <= 1:
+        output_paths = []
+        for json_path in json_paths:
+            print(f"Đang xử lý {json_path}...")
+            try:
+                output_path = convert_category_file(json_path, output_directory, batch_size, compression)
+            except Exception as e:
+                print(f"Lỗi khi xử lý {json_path}: {e}")
+                continue
+            print(f"Đã lưu SQL inserts vào {output_path}")
+            output_paths.append(output_path)
+        return output_paths
+
+    print(f"Đang xử lý {len(json_paths)} file trên {workers} tiến trình...")
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            (json_path, executor.submit(
+                convert_category_file, json_path, output_directory, batch_size, compression
+            ))
+            for json_path in json_paths
+        ]
+        for json_path, future in futures:
+            try:
+                results[json_path] = future.result()
+            except Exception as e:
+                print(f"Lỗi khi xử lý {json_path}: {e}")
+                continue
+            print(f"Đã lưu SQL inserts vào {results[json_path]}")
+    return [results[json_path] for json_path in json_paths if json_path in results]
+
+
+def main(export_format="sql", workers=None, compression=None, batch_size=SQL_BATCH_SIZE):
+    """
+    Hàm chính để xử lý việc tạo các câu lệnh SQL từ các file JSON.
+
+    Args:
+        export_format (str): "sql" để tạo các file *_inserts.sql, "tsv" để tạo file TSV cho từng bảng
+            cùng script LOAD DATA trong data/tsv, "delta" để tạo data/sql/delta/*_delta.sql chỉ chứa
+            các dòng thay đổi so với lần xuất trước (snapshot trong data/sql/snapshots)
+        workers (int, optional): Số tiến trình tạo file SQL song song (mặc định: số CPU)
+        compression (str, optional): "gzip" hoặc "zstd" để nén các file SQL đầu ra (.sql.gz/.sql.zst)
+        batch_size (int): Số dòng tối đa trong một câu lệnh INSERT (và UPSERT/DELETE của delta)
+    """
     # Xác định đường dẫn
     json_directory = os.path.join("data", "json", "category")
+
+    if export_format == "delta":
+        output_directory = os.path.join("data", "sql")
+        json_paths = list_category_json_files(json_directory)
+        # Snapshot của danh mục đã bị xóa khỏi data/json/category cũng cần delta (DELETE toàn bộ)
+        snapshot_directory = os.path.join(output_directory, SNAPSHOT_DIRECTORY)
+        if os.path.isdir(snapshot_directory):
+            names = {os.path.basename(json_path) for json_path in json_paths}
+            json_paths += sorted(
+                os.path.join(json_directory, name) for name in os.listdir(snapshot_directory)
+                if name.endswith(".json") and name not in names
+            )
+        # Dòng chỉ bị xóa khi không còn trong bất kỳ file danh mục nào: quiz chuyển từ danh mục này
+        # sang danh mục khác được UPSERT bởi delta của danh mục mới và không bị delta của danh mục cũ xóa
+        try:
+            keep = current_keys(
+                json_path for json_path in json_paths
+                if os.path.exists(json_path) and os.path.getsize(json_path) > 0
+            )
+        except Exception as e:
+            print(f"Lỗi khi đọc các file danh mục, không tạo delta: {e}")
+            return
+        changed = 0
+        for json_path in json_paths:
+            try:
+                delta_path = write_category_delta(
+                    json_path, output_directory, batch_size, compression=compression, keep=keep
+                )
+            except Exception as e:
+                print(f"Lỗi khi tạo delta cho {json_path}: {e}")
+                continue
+            if delta_path:
+                changed += 1
+                print(f"Đã lưu delta của {json_path} vào {delta_path}")
+        print(f"{changed} file danh mục có thay đổi so với lần xuất trước")
+        return
+
+    if export_format == "tsv":
+        output_directory = os.path.join("data", "tsv")
+        row_counts = export_tsv(list_category_json_files(json_directory), output_directory)
+        for table, count in row_counts.items():
+            print(f"- {table}: {count} dòng")
+        print(f"Đã xuất TSV và {LOAD_SCRIPT_NAME} vào {output_directory}")
+        return
+
     output_directory = os.path.join("data", "sql")
 
     # Tạo thư mục đầu ra nếu nó không tồn tại
     os.makedirs(output_directory, exist_ok=True)
 
-    # Xử lý tất cả các file JSON trong thư mục
-    for filename in os.listdir(json_directory):
-        # Kiểm tra file json và khác rỗng
-        if (
-            filename.endswith(".json")
-            and os.path.getsize(os.path.join(json_directory, filename)) > 0
-        ):
-            print(f"Đang xử lý {filename}...")
-            json_path = os.path.join(json_directory, filename)
-            output_name = f"{os.path.splitext(filename)[0]}_inserts.sql"
-            output_path = os.path.join(output_directory, output_name)
+    # Chỉ chuyển các file JSON đã thay đổi kể từ lần chạy trước
+    start = time.perf_counter()
+    json_paths = list_category_json_files(json_directory)
+    manifest = SqlManifest(output_directory, batch_size)
+    for removed_path in manifest.prune(json_paths):
+        print(f"Đã xóa {removed_path}: file JSON nguồn không còn")
+    changed_paths = [
+        json_path for json_path in json_paths
+        if not manifest.is_up_to_date(json_path, category_output_path(json_path, output_directory, compression))
+    ]
+    print(f"{len(changed_paths)}/{len(json_paths)} file JSON cần tạo lại SQL")
 
-            print(f"Đang xử lý {json_path}...")
-            json_data = load_json(json_path)
-            sql_content = generate_inserts(json_data)
-            save_sql(sql_content, output_path)
-            print(f"Đã lưu SQL inserts vào {output_path}")
+    output_paths = convert_category_files(
+        changed_paths, output_directory, workers or os.cpu_count() or 1, compression, batch_size
+    )
+    converted = {
+        category_output_path(json_path, output_directory, compression): json_path for json_path in changed_paths
+    }
+    for output_path in output_paths:
+        manifest.record(converted[output_path], output_path)
+    manifest.save()
 
     # Gộp tất cả các file SQL lại thành một file duy nhất
-    merged_output_file = os.path.join(output_directory, "merged_sql.sql")
-    merge_sql_files(output_directory, merged_output_file)
-    print(f"Gộp tất cả các file SQL vào {merged_output_file}")
+    merged_output_file = compressed_path(os.path.join(output_directory, "merged_sql.sql"), compression)
+    if merge_sql_files(output_directory, merged_output_file):
+        print(f"Gộp tất cả các file SQL vào {merged_output_file}")
+    else:
+        print(f"Bỏ qua gộp: không file SQL nào thay đổi kể từ lần gộp trước ({merged_output_file})")
+    print(f"Hoàn tất {len(json_paths)} file trong {time.perf_counter() - start:.2f} giây")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Tạo dữ liệu nạp database từ các file JSON danh mục")
+    parser.add_argument(
+        "--format", choices=("sql", "tsv", "delta"), default="sql",
+        help="sql: các file INSERT trong data/sql; tsv: file TSV cho từng bảng và script LOAD DATA trong data/tsv; "
+             "delta: UPSERT/DELETE so với lần xuất trước trong data/sql/delta",
+    )
+    parser.add_argument("--workers", type=int, help="Số tiến trình tạo file SQL song song (mặc định: số CPU)")
+    parser.add_argument(
+        "--compress", choices=tuple(COMPRESSION_SUFFIXES),
+        help="Nén các file SQL đầu ra (zstd cần cài zstandard)",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=SQL_BATCH_SIZE,
+        help=f"Số dòng tối đa trong một câu lệnh INSERT nhiều dòng (mặc định: {SQL_BATCH_SIZE})",
+    )
+    args = parser.parse_args()
+    if args.batch_size < 1:
+        parser.error("--batch-size phải lớn hơn 0")
+    main(args.format, args.workers, args.compress, args.batch_size)
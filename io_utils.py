@@ -0,0 +1,467 @@
+import ctypes
+import gzip
+import hashlib
+import io
+import json
+import os
+import secrets
+import shutil
+import stat
+import sys
+from contextlib import contextmanager
+
+try:
+    import orjson
+except ImportError:  # orjson là tùy chọn, không có thì dùng thư viện json chuẩn
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard là tùy chọn, chỉ cần khi đọc/ghi file .zst
+    zstandard = None
+
+# Tên backend JSON đang được dùng, để in ra khi đo đạc
+JSON_BACKEND = "orjson" if orjson is not None else "json"
+
+# Các kiểu định dạng đầu ra JSON: "pretty" cho file người sửa tay,
+# "compact" (không thụt lề, không khoảng trắng thừa) cho file chỉ máy đọc như merged_*_quizzes.json
+OUTPUT_PROFILES = ("pretty", "compact")
+
+
+def json_format_options(profile="pretty", indent=4):
+    """
+    Tham số định dạng truyền cho json.dump/json.dumps theo kiểu đầu ra
+
+    Args:
+        profile (str): "pretty" hoặc "compact"
+        indent (int): Số khoảng trắng thụt lề khi dùng "pretty"
+
+    Returns:
+        dict: Các tham số indent/separators tương ứng
+    """
+    if profile == "pretty":
+        return {"indent": indent}
+    if profile == "compact":
+        return {"separators": (",", ":")}
+    raise ValueError(f"Kiểu định dạng đầu ra không hợp lệ: {profile} (chỉ hỗ trợ {', '.join(OUTPUT_PROFILES)})")
+
+
+def json_loads(data):
+    """Phân tích chuỗi JSON (bytes UTF-8 hoặc str) bằng backend nhanh nhất hiện có"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, bytes):
+        data = data.decode("utf-8")
+    return json.loads(data)
+
+
+def load_json(file_path):
+    """Đọc và phân tích một file JSON mã hóa UTF-8 (tự giải nén nếu là .json.gz/.json.zst)"""
+    with open_input(file_path) as f:
+        return json_loads(f.read())
+
+
+def _contains_float(obj):
+    """Dữ liệu JSON có chứa số thực (float) ở bất kỳ cấp nào hay không"""
+    stack = [obj]
+    while stack:
+        value = stack.pop()
+        value_type = type(value)
+        if value_type is dict:
+            stack.extend(value.values())
+        elif value_type is list or value_type is tuple:
+            stack.extend(value)
+        elif value_type is float:
+            return True
+    return False
+
+
+def _orjson_dumps(obj, profile, indent):
+    """
+    Ghi JSON bằng orjson sao cho giống hệt từng byte với json.dumps(..., ensure_ascii=False)
+
+    orjson chỉ hỗ trợ thụt lề 2, nên với thụt lề 4, 6... khoảng trắng đầu mỗi dòng được nhân lên.
+    Chuỗi trong JSON không bao giờ chứa ký tự xuống dòng thật, nên khoảng trắng đầu dòng luôn là thụt lề
+    """
+    if profile == "compact":
+        return orjson.dumps(obj).decode("utf-8")
+
+    raw = orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+    factor = indent // 2
+    if factor > 1:
+        raw = b"\n".join([
+            b" " * ((factor - 1) * (len(line) - len(line.lstrip(b" ")))) + line
+            for line in raw.split(b"\n")
+        ])
+    return raw.decode("utf-8")
+
+
+def json_dumps(obj, profile="pretty", indent=4, ensure_ascii=False):
+    """
+    Chuyển obj thành chuỗi JSON theo kiểu đầu ra, dùng orjson khi có thể
+
+    Kết quả giống json.dumps(obj, ensure_ascii=..., **json_format_options(profile, indent)).
+    Các trường hợp orjson không làm được (ensure_ascii=True, thụt lề lẻ, khóa không phải chuỗi,
+    số nguyên vượt 64 bit) sẽ dùng thư viện json chuẩn. Dữ liệu có số thực cũng dùng thư viện chuẩn:
+    orjson viết số mũ khác (1e-7 thay vì 1e-07) và đổi NaN/Infinity thành null
+    """
+    options = json_format_options(profile, indent)
+    if (orjson is not None and not ensure_ascii and (profile == "compact" or indent and indent % 2 == 0)
+            and not _contains_float(obj)):
+        try:
+            return _orjson_dumps(obj, profile, indent)
+        except TypeError:
+            pass
+    return json.dumps(obj, ensure_ascii=ensure_ascii, **options)
+
+
+def dump_json(obj, file, profile="pretty", indent=4, ensure_ascii=False):
+    """Ghi obj dạng JSON vào file văn bản đã mở (xem json_dumps)"""
+    file.write(json_dumps(obj, profile, indent, ensure_ascii))
+
+
+# Kích thước bộ đệm khi phải sao chép file bằng Python
+COPY_BUFFER_SIZE = 1024 * 1024
+
+
+def sha256_file(file_path):
+    """Mã băm SHA-256 (dạng hex) của nội dung file, đọc theo từng đoạn COPY_BUFFER_SIZE"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(COPY_BUFFER_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_signature(file_path):
+    """[kích thước, mtime_ns] của file, dạng lưu được trong manifest/chỉ mục JSON để nhận biết file đã thay đổi"""
+    st = os.stat(file_path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def append_file(source_path, dst_file):
+    """
+    Nối nguyên byte file source_path vào cuối file nhị phân dst_file đang mở để ghi
+
+    Trên Linux dùng os.sendfile để kernel sao chép thẳng giữa hai file, không qua bộ nhớ Python;
+    nếu không được thì quay về shutil.copyfileobj theo từng đoạn COPY_BUFFER_SIZE.
+    Nếu dst_file là file nén mở bằng open_atomic, dữ liệu đi qua bộ nén chứ không ghi thẳng vào file tạm
+    """
+    dst_file.flush()
+    with open(source_path, "rb") as src:
+        if hasattr(os, "sendfile") and not hasattr(dst_file, "atomic_raw"):
+            offset = 0
+            remaining = os.fstat(src.fileno()).st_size
+            try:
+                while remaining > 0:
+                    sent = os.sendfile(dst_file.fileno(), src.fileno(), offset, remaining)
+                    if sent == 0:
+                        break
+                    offset += sent
+                    remaining -= sent
+                return
+            except OSError:
+                # Ví dụ macOS chỉ cho sendfile tới socket; chỉ quay về cách khác nếu chưa ghi byte nào
+                if offset:
+                    raise
+        shutil.copyfileobj(src, dst_file, COPY_BUFFER_SIZE)
+
+
+# Kiểu nén theo đuôi file: file có đuôi này được nén khi ghi và giải nén khi đọc
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_EXTENSIONS = {suffix: compression for compression, suffix in COMPRESSION_SUFFIXES.items()}
+
+# Mức nén: gzip 6 như lệnh gzip, zstd 3 là mặc định của zstd
+GZIP_LEVEL = 6
+ZSTD_LEVEL = 3
+
+
+def compression_for_path(file_path):
+    """Kiểu nén ("gzip", "zstd") suy ra từ đuôi file, None nếu file không nén"""
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(file_path)[1].lower())
+
+
+def compressed_path(file_path, compression=None):
+    """Thêm đuôi của kiểu nén vào file_path (giữ nguyên nếu compression là None)"""
+    if compression is None:
+        return file_path
+    if compression not in COMPRESSION_SUFFIXES:
+        raise ValueError(
+            f"Kiểu nén không hợp lệ: {compression} (chỉ hỗ trợ {', '.join(COMPRESSION_SUFFIXES)})"
+        )
+    return file_path + COMPRESSION_SUFFIXES[compression]
+
+
+def _require_zstandard():
+    if zstandard is None:
+        raise ImportError("Cần cài zstandard để đọc/ghi file .zst (pip install zstandard)")
+    return zstandard
+
+
+def open_input(file_path, mode="rb", encoding="utf-8"):
+    """
+    Mở file để đọc, giải nén dần theo từng đoạn khi đọc nếu file có đuôi .gz hoặc .zst
+
+    File nén gồm nhiều phần nối tiếp nhau (nhiều member gzip hoặc nhiều frame zstd, như file gộp
+    của merge_sql_files) được đọc liền như một file
+
+    Args:
+        file_path (str): File cần đọc
+        mode (str): "rb" cho nhị phân hoặc "r" cho văn bản
+        encoding (str): Bảng mã khi đọc văn bản
+    """
+    compression = compression_for_path(file_path)
+    if compression is None:
+        if "b" in mode:
+            return open(file_path, "rb")
+        return open(file_path, "r", encoding=encoding)
+
+    if compression == "gzip":
+        stream = gzip.open(file_path, "rb")
+    else:
+        raw = open(file_path, "rb")
+        try:
+            stream = io.BufferedReader(
+                _require_zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames=True),
+                COPY_BUFFER_SIZE,
+            )
+        except BaseException:
+            raw.close()
+            raise
+    if "b" in mode:
+        return stream
+    return io.TextIOWrapper(stream, encoding=encoding)
+
+
+def _compressed_writer(raw, compression):
+    """
+    Luồng nén ghi vào file nhị phân raw. Đóng luồng này sẽ ghi phần kết thúc của dữ liệu nén
+    nhưng không đóng raw
+
+    gzip được ghi với mtime=0 và không có tên file trong header để cùng nội dung luôn cho cùng các byte
+    """
+    if compression == "gzip":
+        return gzip.GzipFile(filename="", mode="wb", compresslevel=GZIP_LEVEL, fileobj=raw, mtime=0)
+    writer = _require_zstandard().ZstdCompressor(level=ZSTD_LEVEL).stream_writer(
+        raw, closefd=False, write_return_read=True
+    )
+    return io.BufferedWriter(writer, COPY_BUFFER_SIZE)
+
+
+def fsync_directory(directory):
+    """Đồng bộ thư mục xuống đĩa để thao tác đổi tên file được ghi lại (bỏ qua trên Windows)"""
+    if os.name == "nt":
+        return
+    fd = os.open(directory or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _load_syncfs():
+    """Hàm syncfs của libc (chỉ có trên Linux), None nếu không dùng được"""
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        return ctypes.CDLL(None, use_errno=True).syncfs
+    except (OSError, AttributeError):
+        return None
+
+
+_syncfs = _load_syncfs()
+
+
+def syncfs(file_path):
+    """
+    Đồng bộ toàn bộ filesystem chứa file_path bằng một lệnh syncfs
+
+    Returns:
+        bool: False nếu hệ thống không hỗ trợ syncfs hoặc lệnh lỗi, khi đó cần fsync từng file
+    """
+    if _syncfs is None:
+        return False
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        return _syncfs(fd) == 0
+    finally:
+        os.close(fd)
+
+
+class AtomicWriteBatch:
+    """
+    Gom nhiều lần ghi thay thế file để đồng bộ xuống đĩa cùng một lúc
+
+    Mỗi file được ghi vào một file tạm cạnh file đích. Khi commit, dữ liệu các file tạm được đồng bộ
+    bằng một lệnh syncfs cho mỗi filesystem (Linux; nơi khác thì fdatasync từng file tạm), sau đó các
+    file tạm mới được os.replace vào vị trí file đích và mỗi thư mục chỉ fsync một lần. Nếu tiến trình
+    chết giữa chừng, các file đích vẫn giữ nguyên nội dung cũ
+    """
+
+    def __init__(self):
+        self.pending = []
+        self._callbacks = []
+
+    def add(self, temp_path, target_path):
+        """Đăng ký một file tạm sẽ thay thế file đích khi commit"""
+        self.pending.append((temp_path, target_path))
+
+    def extend(self, pending):
+        """Nhận các file tạm được ghi ở nơi khác (ví dụ trong tiến trình con)"""
+        self.pending.extend(pending)
+
+    def after_commit(self, callback):
+        """Đăng ký hàm được gọi sau khi các file đã được thay thế"""
+        self._callbacks.append(callback)
+
+    def commit(self):
+        """Đồng bộ các file tạm xuống đĩa rồi thay thế tất cả các file đích"""
+        pending, self.pending = self.pending, []
+        callbacks, self._callbacks = self._callbacks, []
+        if pending:
+            # Một file tạm đại diện cho mỗi filesystem: syncfs ghi mọi dữ liệu bẩn của filesystem đó
+            filesystems = {}
+            for temp_path, _ in pending:
+                filesystems.setdefault(os.stat(temp_path).st_dev, temp_path)
+            if not all(syncfs(temp_path) for temp_path in filesystems.values()):
+                # fdatasync đủ cho nội dung file tạm: metadata cần thiết (tên file) được ghi khi fsync thư mục
+                sync = getattr(os, "fdatasync", os.fsync)
+                for temp_path, _ in pending:
+                    with open(temp_path, "r+b") as f:
+                        sync(f.fileno())
+
+            directories = set()
+            for temp_path, target_path in pending:
+                os.replace(temp_path, target_path)
+                directories.add(os.path.dirname(os.path.abspath(target_path)))
+            for directory in directories:
+                fsync_directory(directory)
+
+        for callback in callbacks:
+            callback()
+
+    def rollback(self):
+        """Xóa các file tạm chưa được commit, giữ nguyên các file đích"""
+        pending, self.pending = self.pending, []
+        self._callbacks = []
+        for temp_path, _ in pending:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def open_atomic(file_path, mode="w", encoding="utf-8", compress=True, buffering=-1):
+    """
+    Mở một file tạm cạnh file_path để ghi. File tạm có quyền truy cập giống file đích
+    (hoặc quyền mặc định theo umask nếu file đích chưa tồn tại)
+
+    Nếu file_path có đuôi .gz hoặc .zst, dữ liệu được nén dần khi ghi. Đặt compress=False khi dữ liệu
+    ghi vào đã được nén sẵn (ví dụ nối các file .gz thành một file .gz). buffering được truyền cho
+    os.fdopen như tham số cùng tên của open() (với file nén là bộ đệm của dữ liệu đã nén)
+
+    Returns:
+        tuple: (file object, đường dẫn file tạm)
+    """
+    directory = os.path.dirname(os.path.abspath(file_path))
+    while True:
+        temp_path = os.path.join(
+            directory, f".{os.path.basename(file_path)}.{secrets.token_hex(4)}.tmp"
+        )
+        try:
+            fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+            break
+        except FileExistsError:
+            continue
+
+    try:
+        os.chmod(temp_path, stat.S_IMODE(os.stat(file_path).st_mode))
+    except OSError:
+        pass
+
+    compression = compression_for_path(file_path) if compress else None
+    if compression is None:
+        if "b" in mode:
+            return os.fdopen(fd, mode, buffering), temp_path
+        return os.fdopen(fd, mode, buffering, encoding=encoding), temp_path
+
+    raw = os.fdopen(fd, "wb", buffering)
+    try:
+        stream = _compressed_writer(raw, compression)
+    except BaseException:
+        raw.close()
+        os.remove(temp_path)
+        raise
+    file = stream if "b" in mode else io.TextIOWrapper(stream, encoding=encoding)
+    # finish_atomic/abort_atomic cần file tạm thật bên dưới bộ nén
+    file.atomic_raw = raw
+    return file, temp_path
+
+
+def finish_atomic(file, temp_path, file_path, batch=None):
+    """
+    Hoàn tất file mở bằng open_atomic: fsync rồi os.replace vào file_path,
+    hoặc giao cho batch để fsync và thay thế cùng các file khác
+    """
+    raw = getattr(file, "atomic_raw", file)
+    try:
+        if raw is not file:
+            # Đóng bộ nén để ghi nốt phần kết thúc của dữ liệu nén, file tạm vẫn mở
+            file.close()
+        raw.flush()
+        if batch is None:
+            os.fsync(raw.fileno())
+        raw.close()
+    except BaseException:
+        abort_atomic(file, temp_path)
+        raise
+
+    if batch is None:
+        os.replace(temp_path, file_path)
+        fsync_directory(os.path.dirname(os.path.abspath(file_path)))
+    else:
+        batch.add(temp_path, file_path)
+
+
+def abort_atomic(file, temp_path):
+    """Hủy file mở bằng open_atomic, file đích không bị đụng tới"""
+    raw = getattr(file, "atomic_raw", file)
+    try:
+        file.close()
+    finally:
+        raw.close()
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+
+
+@contextmanager
+def atomic_write(file_path, mode="w", encoding="utf-8", batch=None, compress=True, buffering=-1):
+    """
+    Ghi file theo kiểu an toàn khi tiến trình bị dừng đột ngột: ghi vào file tạm, fsync rồi os.replace
+
+    Args:
+        file_path (str): File đích, được nén nếu có đuôi .gz hoặc .zst
+        mode (str): "w" cho văn bản hoặc "wb" cho nhị phân
+        encoding (str): Bảng mã khi ghi văn bản
+        batch (AtomicWriteBatch, optional): Nếu có, việc fsync và thay thế được dồn đến khi batch commit
+        compress (bool): Đặt False để ghi nguyên byte vào file .gz/.zst (dữ liệu đã được nén sẵn)
+        buffering (int): Kích thước bộ đệm ghi như tham số buffering của open(), -1 là mặc định
+    """
+    file, temp_path = open_atomic(file_path, mode, encoding, compress, buffering)
+    try:
+        yield file
+    except BaseException:
+        abort_atomic(file, temp_path)
+        raise
+    finish_atomic(file, temp_path, file_path, batch)